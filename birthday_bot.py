@@ -1,25 +1,32 @@
 import core.logger
 
-from datetime import time
-import pytz
+import asyncio
 
 from telegram import Update
 from telegram.ext import ApplicationBuilder, CommandHandler
 from telegram.warnings import PTBUserWarning
 from warnings import filterwarnings
 
-from handlers.reminder import reminder
+from handlers.reminder import schedule_reminders
 
 filterwarnings(
     action="ignore", message=r".*CallbackQueryHandler", category=PTBUserWarning
 )
 
-from core.config import BOT_TOKEN
+from core.config import BOT_TOKEN, CONCURRENT_UPDATES, METRICS_HOST, METRICS_PORT
+from core.api_requests import session_manager
+from core.instrumentation import instrument_handlers
+from core.metrics import metrics_server
+from core.watchdog import loop_watchdog
+from core.storage import init_db
+from core.update_processor import PerUserUpdateProcessor
 from handlers.start import start
 from handlers.add import add_conv_handler
 from handlers.change import change_conv_handler
 from handlers.delete import delete_conv_handler
 from handlers.list import list_birthdays
+from handlers.upcoming import upcoming_birthdays
+from handlers.settings import settings
 
 
 def main() -> None:
@@ -28,22 +35,29 @@ def main() -> None:
     Create and start polling an application with handlers for manipulating birthdays using
     [birthday-api](https://github.com/orehzzz/birthday-api).
 
-    Send a daily reminder about the birthdays
+    Send a daily reminder about the birthdays at the time chosen by each user
     """
-
-    application = ApplicationBuilder().token(BOT_TOKEN).post_init(post_init).build()
+    init_db()
+
+    application = (
+        ApplicationBuilder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
 
     application.add_handler(CommandHandler("start", start))
     application.add_handler(add_conv_handler)
     application.add_handler(change_conv_handler)
     application.add_handler(delete_conv_handler)
     application.add_handler(CommandHandler("list", list_birthdays))
+    application.add_handler(CommandHandler("upcoming", upcoming_birthdays))
+    application.add_handler(CommandHandler("settings", settings))
+    instrument_handlers(application)
 
-    job_queue = application.job_queue
-    job_queue.run_daily(
-        callback=reminder,
-        time=time(hour=10, tzinfo=pytz.timezone("Europe/Kyiv")),
-    )
+    schedule_reminders(application.job_queue)
 
     application.run_polling(allowed_updates=Update.ALL_TYPES)
 
@@ -52,7 +66,14 @@ async def post_init(application: ApplicationBuilder) -> None:
     """Post initialization function for the bot.
 
     Set bot's name, short/long description and commands.
+    Start refreshing api sessions in the background, serving metrics and watching
+    the event loop.
     """
+    session_manager.start_refresher()
+    if METRICS_PORT:
+        metrics_server.start(METRICS_HOST, METRICS_PORT)
+    loop_watchdog.start(asyncio.get_running_loop())
+
     # Comment this if you need to restart the bot several times
     await application.bot.set_my_name("BirthdayBot")
     await application.bot.set_my_short_description("To remember everyone's birthday!")
@@ -65,10 +86,12 @@ async def post_init(application: ApplicationBuilder) -> None:
     # /start is excluded from the commands list
     await application.bot.set_my_commands(
         [
-            ("list", "list all birthdays"),
+            ("list", "list all birthdays, or the next N with /list N"),
+            ("upcoming", "birthdays of the next 30 days, or /upcoming N days"),
             ("add", "add a birthday"),
             ("change", "change a birthday"),
             ("delete", "delete a birthday"),
+            ("settings", "set your time zone and reminder hour"),
             (
                 "skip",
                 "skip the current action (if possible) during /add or /change commands",
@@ -78,5 +101,16 @@ async def post_init(application: ApplicationBuilder) -> None:
     )
 
 
+async def post_shutdown(application: ApplicationBuilder) -> None:
+    """Post shutdown function for the bot.
+
+    Close api sessions and their connections, stop serving metrics and watching
+    the event loop.
+    """
+    loop_watchdog.stop()
+    await session_manager.close()
+    await metrics_server.close()
+
+
 if __name__ == "__main__":
     main()
@@ -1,120 +1,420 @@
-import requests
-from time import time
+from collections import OrderedDict
+from functools import wraps
+from time import time, perf_counter
+import asyncio
 import base64
 import logging
 
-from requests import RequestException
+import httpx
+from httpx import RequestError
 from cryptography.hazmat.primitives import serialization
 from cryptography.hazmat.primitives.asymmetric import padding
 from cryptography.hazmat.primitives import hashes
+import hashlib
+
+from core.config import (
+    API_URL,
+    BOT_TOKEN,
+    MAX_SESSIONS,
+    MAX_CONNECTIONS,
+    MAX_KEEPALIVE_CONNECTIONS,
+    KEEPALIVE_EXPIRY,
+)
+from core.cache import birthday_cache, response_cache
+from core.index import NameIndex, DateIndex
+from core.json_stream import iter_json_array
+from core.metrics import registry
 
-from core.config import BOT_TOKEN
-
-PUBLIC_KEY = None
 JWT_EXPIRES_SECONDS = 60 * 60
+# Sessions used since their last login are relogged this long before the JWT expires
+JWT_REFRESH_MARGIN_SECONDS = 5 * 60
+REFRESH_INTERVAL_SECONDS = 60
+
+# Connection pool to the api shared by all sessions. Sessions only hold their own
+# cookies and headers, so they must not be closed one by one - close the transport.
+transport = httpx.AsyncHTTPTransport(
+    limits=httpx.Limits(
+        max_connections=MAX_CONNECTIONS,
+        max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=KEEPALIVE_EXPIRY,
+    )
+)
+
+api_request_seconds = registry.histogram(
+    "birthdaybot_api_request_seconds",
+    "Time of api requests including getting the session, by function",
+    labels=("function",),
+)
+api_responses_total = registry.counter(
+    "birthdaybot_api_responses_total",
+    "Api responses by function and status code, `error` if no response",
+    labels=("function", "status"),
+)
+api_logins_total = registry.counter(
+    "birthdaybot_api_logins_total",
+    "Logins to the api by result",
+    labels=("result",),
+)
+registry.counter(
+    "birthdaybot_bot_id_encryptions_total",
+    "RSA encryptions of the bot token",
+    function=lambda: encrypted_bot_id_cache.encryptions,
+)
+registry.counter(
+    "birthdaybot_bot_id_encryption_seconds_total",
+    "Time spent on RSA encryptions of the bot token",
+    function=lambda: encrypted_bot_id_cache.encryption_seconds,
+)
+registry.counter(
+    "birthdaybot_bot_id_cache_hits_total",
+    "Logins that reused the encrypted bot token",
+    function=lambda: encrypted_bot_id_cache.hits,
+)
+registry.counter(
+    "birthdaybot_public_key_updates_total",
+    "Times the api's public key was received",
+    function=lambda: encrypted_bot_id_cache.key_updates,
+)
+registry.gauge(
+    "birthdaybot_api_sessions",
+    "Number of api sessions kept in memory",
+    function=lambda: len(session_manager.sessions),
+)
+
+
+def observed(request_function):
+    """Record time and response status code of an api request function"""
+    name = request_function.__name__
+    seconds = api_request_seconds.labels(name)
+
+    @wraps(request_function)
+    async def wrapper(*args, **kwargs):
+        start = perf_counter()
+        status = "error"
+        try:
+            response = await request_function(*args, **kwargs)
+            status = str(response.status_code)
+            return response
+        finally:
+            seconds.observe(perf_counter() - start)
+            api_responses_total.labels(name, status).inc()
+
+    return wrapper
 
 
 class SessionManager:
     """Class to manage sessions
 
     Should be used to get sessions by id. If the session doesn't exist or has expired,
-    a new session is created.
+    a new session is created and logged in. Only one login per id runs at a time.
+    Once `start_refresher()` is called, sessions in use are relogged in the background
+    shortly before their JWT expires.
+
+    Sessions are kept in least recently used order. When there are more than
+    `max_sessions` of them, the least recently used one is evicted. Expired sessions
+    at the least recently used end are dropped on every new login.
+
+    Args:
+        max_sessions (int): Maximum number of sessions to keep
 
     Attributes:
-        sessions (dict): Dictionary to store sessions with their ids as keys
+        sessions (OrderedDict): Sessions with their ids as keys, least recently used first
+        max_sessions (int): Maximum number of sessions to keep
+        hits (int): Number of times a valid session was found
+        misses (int): Number of times a session had to be created
+        evictions (int): Number of sessions evicted because of the `max_sessions` limit
+        expirations (int): Number of expired sessions dropped
+        logins (dict): In-flight login tasks with session ids as keys
+        coalesced_logins (int): Number of callers that waited for an in-flight login
+        refreshes (int): Number of sessions relogged by the background refresher
+        refresher (asyncio.Task): Background refresher task, None until started
 
     """
 
-    def __init__(self):
-        self.sessions = {}
-
-    def get_session(self, id):
+    def __init__(self, max_sessions=MAX_SESSIONS):
+        self.sessions = OrderedDict()
+        self.max_sessions = max_sessions
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.logins = {}
+        self.coalesced_logins = 0
+        self.refreshes = 0
+        self.refresher = None
+
+    async def get_session(self, id):
         """Get session by id.
 
-        Create a new session if it doesn't exist or has expired."""
-        if id not in self.sessions or self.sessions[id].is_expired():
-            if id == BOT_TOKEN:
-                logging.info("Creating admin session")
-                self.sessions[id] = AdminSession()
+        Create and log in a new session if it doesn't exist or has expired."""
+        session = self.sessions.get(id)
+        if session is not None and not session.is_expired():
+            self.hits += 1
+            self.sessions.move_to_end(id)
+            return session
+
+        self.misses += 1
+        # Concurrent callers for the same id wait for one login instead of starting their own
+        login = self.logins.get(id)
+        if login is None:
+            login = asyncio.get_running_loop().create_task(self._create_session(id))
+            self.logins[id] = login
+            login.add_done_callback(lambda _: self.logins.pop(id, None))
+        else:
+            self.coalesced_logins += 1
+            logging.debug("Waiting for in-flight login of session with id: %s", id)
+
+        return await asyncio.shield(login)
+
+    async def _create_session(self, id):
+        """Create and log in a new session, store it in the manager"""
+        if id == BOT_TOKEN:
+            logging.info("Creating admin session")
+            session = AdminSession()
+        else:
+            logging.info("Creating user session with id: %s", id)
+            session = CustomSession(id)
+
+        await session.authenticate()
+
+        # Expired session is not closed here, other coroutines may still use it
+        self.sessions[id] = session
+        self.sessions.move_to_end(id)
+        self._evict()
+
+        return session
+
+    def _evict(self):
+        """Drop expired sessions and the least recently used ones over the limit"""
+        while self.sessions:
+            id, session = next(iter(self.sessions.items()))
+            if len(self.sessions) > self.max_sessions:
+                self.evictions += 1
+            elif session.is_expired():
+                self.expirations += 1
             else:
-                logging.info(f"Creating user session with id: {id}")
-                self.sessions[id] = CustomSession(id)
+                break
+
+            del self.sessions[id]
+            logging.debug("Session with id: %s evicted", id)
 
-        return self.sessions[id]
+    def start_refresher(self):
+        """Start relogging sessions in the background before their JWT expires"""
+        if self.refresher is None:
+            self.refresher = asyncio.get_running_loop().create_task(self._refresh())
+
+    async def _refresh(self):
+        """Relogin sessions that were used since their last login and expire soon"""
+        while True:
+            await asyncio.sleep(REFRESH_INTERVAL_SECONDS)
+
+            sessions = [s for s in self.sessions.values() if s.needs_refresh()]
+            if not sessions:
+                continue
+
+            logging.info("Refreshing %s sessions", len(sessions))
+            results = await asyncio.gather(
+                *(session.relogin() for session in sessions), return_exceptions=True
+            )
+            for session, result in zip(sessions, results):
+                if isinstance(result, Exception):
+                    logging.warning(
+                        "Failed to refresh session with id: %s: %s", session.id, result
+                    )
+                else:
+                    self.refreshes += 1
+
+    def stats(self) -> dict:
+        """Return size of the session store and its counters"""
+        return {
+            "size": len(self.sessions),
+            "max_sessions": self.max_sessions,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "coalesced_logins": self.coalesced_logins,
+            "refreshes": self.refreshes,
+        }
+
+    async def close(self):
+        """Stop the refresher, drop all sessions and close the shared connection pool"""
+        if self.refresher is not None:
+            self.refresher.cancel()
+            self.refresher = None
+        self.sessions.clear()
+        await transport.aclose()
+        logging.info("Sessions closed. Stats: %s", self.stats())
 
 
 session_manager = SessionManager()
 
 
-class CustomSession(requests.Session):
-    """Extend `requests.Session` class with custom properties and methods.
+class CustomSession(httpx.AsyncClient):
+    """Extend `httpx.AsyncClient` class with custom properties and methods.
+
+    The session is not logged in on creation, `login()` has to be awaited first.
+    Session only keeps user's authentication (JWT cookie and `X-CSRF-TOKEN` header),
+    connections are taken from the shared `transport`.
 
     Args:
         id: id of the session. Should be user's id or bot's token
 
     Attributes:
         id: id of the session
-        time_created: Time when the session was created
-        hooks: List of hooks to be executed before or after the request
+        time_created: Time when the session was created or last logged in
+        last_used: Time of the last request sent with the session
+        login_lock: Lock to run one login of the session at a time
     """
 
     def __init__(self, id):
-        super().__init__()
+        super().__init__(transport=transport)
         self.id = id
         self.time_created = time()
-        self.login(self._encrypt_bot_id())
-        self.hooks["response"].append(self.pre_request_hook)
+        self.last_used = 0.0
+        self.login_lock = asyncio.Lock()
 
     def is_expired(self) -> bool:
         """Check if the session has expired"""
         return time() - self.time_created > JWT_EXPIRES_SECONDS
 
-    def login(self, encrypted_bot_id) -> bool:
+    async def login(self, encrypted_bot_id) -> bool:
         """Login to the api with the given `encrypted_bot_id`.
 
         Args:
-            encrypted_bot_id (str): Bot's id encrypted with the `PUBLIC_KEY`
+            encrypted_bot_id (str): Bot's id encrypted with the api's public key
 
         Raises:
-            RequestException: Raised if request to the api failed
+            RequestError: Raised if request to the api failed
 
         Returns:
             bool: True if login was successful
         """
         try:
-            login_response = self.get(
-                "http://127.0.0.1:8080/login",
-                params={"encrypted_bot_id": encrypted_bot_id, "id": self.id},
+            login_response = await self.send(
+                self.build_request(
+                    "GET",
+                    f"{API_URL}/login",
+                    params={"encrypted_bot_id": encrypted_bot_id, "id": self.id},
+                )
             )
             login_response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to login user {self.id} to the api: {e}.")
-            raise RequestException("Failed to login to api")
+        except httpx.HTTPError as e:
+            logging.error("Failed to login user %s to the api: %s.", self.id, e)
+            api_logins_total.labels("failure").inc()
+            raise RequestError("Failed to login to api")
 
         csrf_access_token = self.cookies["csrf_access_token"]
 
         self.headers.update({"X-CSRF-TOKEN": csrf_access_token})
+        self.time_created = time()
 
-        logging.info(f"User with id: {self.id} successfully logged in to the api")
+        logging.info("User with id: %s successfully logged in to the api", self.id)
+        api_logins_total.labels("success").inc()
         return True
 
-    # do i need response?
-    def pre_request_hook(self, response, *args, **kwargs):
-        """Function to be executed before each request.
+    async def request(self, method, url, **kwargs) -> httpx.Response:
+        """Send a request, relogin and retry it once if the api responds with 401.
+
+        Login requests are sent with `send()` and are not retried.
+        """
+        sent_at = self.last_used = time()
+        response = await super().request(method, url, **kwargs)
+
+        if response.status_code == 401:
+            logging.info("Session with id: %s is unauthorized. Relogging", self.id)
+            # Concurrent requests of the session may have changed `last_used` since
+            await self.relogin(response_time=sent_at)
+            response = await super().request(method, url, **kwargs)
 
-        Check if the session has expired and relogins if needed.
+        return response
 
+    async def conditional_get(self, url) -> httpx.Response:
+        """Send a GET request with validators of the last response from the url.
+
+        Validators and body of the last response are kept in `response_cache`.
+        If the api responds with 304, the kept body is returned with status 200,
+        so the body is not downloaded when it hasn't changed.
         """
+        key = (self.id, url)
+        headers = {}
+        cached = response_cache.get(key)
+        if cached is not None:
+            cached_headers, cached_content = cached
+            if "ETag" in cached_headers:
+                headers["If-None-Match"] = cached_headers["ETag"]
+            if "Last-Modified" in cached_headers:
+                headers["If-Modified-Since"] = cached_headers["Last-Modified"]
+
+        response = await self.get(url, headers=headers)
+
+        if response.status_code == 304 and cached is not None:
+            logging.debug("Response from %s not modified", url)
+            return httpx.Response(
+                200,
+                headers=cached_headers,
+                content=cached_content,
+                request=response.request,
+            )
+
+        if response.status_code == 200 and (
+            "ETag" in response.headers or "Last-Modified" in response.headers
+        ):
+            response_cache.set(key, response.headers, response.content)
+        else:
+            response_cache.invalidate(key)
+
+        return response
+
+    async def relogin(self, response_time=None):
+        """Login again with `authenticate()`.
+
+        Concurrent calls result in one login.
+
+        Args:
+            response_time (float): Time of the request that failed. Login is skipped if
+              the session has logged in after it
+        """
+        time_created = self.time_created if response_time is None else response_time
+
+        async with self.login_lock:
+            if self.time_created > time_created:
+                return
+            await self.authenticate()
+
+    async def authenticate(self):
+        """Login with the cached encrypted bot id, retry once with a fresh public key
 
-        if self.is_expired():
-            logging.info(f"Session with id: {self.id} has expired. Relogging")
-            self.login(self._encrypt_bot_id())
+        The api might have rotated its key pair, then the cached key is requested
+        again unless another login already did it after this one started.
 
-    def _get_public_key(self):
+        Raises:
+            RequestError: Raised if both logins or the public key request failed
+        """
+        started = time()
+        try:
+            await self.login(await self._encrypt_bot_id())
+        except RequestError:
+            # Admin session's id is the bot token, it must not be logged
+            logging.warning(
+                "Login of session with id: %s failed, requesting new key",
+                "admin" if self.id == BOT_TOKEN else self.id,
+            )
+            await self.login(await self._encrypt_bot_id(key_received_before=started))
+
+    def needs_refresh(self) -> bool:
+        """Check if the session was used since its last login and the JWT expires soon"""
+        return (
+            self.last_used > self.time_created
+            and time() - self.time_created
+            > JWT_EXPIRES_SECONDS - JWT_REFRESH_MARGIN_SECONDS
+        )
+
+    async def _get_public_key(self):
         """Request public key from the api and return it as a cryptography object
 
         Raises:
-            RequestException: Raised if the request to the api failed
+            RequestError: Raised if the request to the api failed
 
         Returns:
             cryptography.hazmat.primitives.asymmetric.rsa.RSAPublicKey:
@@ -122,11 +422,13 @@ class CustomSession(requests.Session):
 
         """
         try:
-            response = requests.get("http://127.0.0.1:8080/public-key")
+            response = await self.send(
+                self.build_request("GET", f"{API_URL}/public-key")
+            )
             response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to request public key: {e}")
-            raise RequestException("Failed to request public key")
+        except httpx.HTTPError as e:
+            logging.error("Failed to request public key: %s", e)
+            raise RequestError("Failed to request public key")
 
         public_key_json = response.json()
         public_key = serialization.load_pem_public_key(
@@ -136,26 +438,96 @@ class CustomSession(requests.Session):
         logging.info("Public key successfully received")
         return public_key
 
-    def _encrypt_bot_id(self, request_key=False):
-        """Encrypt bot token with the public key and return it as a base64 string
+    async def _encrypt_bot_id(self, key_received_before=None):
+        """Return bot token encrypted with the public key as a base64 string
+
+        Encrypted token is taken from `encrypted_bot_id_cache`, so RSA encryption only
+        runs when the public key changes.
 
         Args:
-            request_key (bool): If True, requests the public key from the api. Else,
-              tries to use the cached key.
+            key_received_before (float): If set, requests the public key from the api
+              unless the cached key was received after this time. Else, uses the
+              cached key.
 
         Raises:
-            RequestException: Raised if the public key request to the api failed
+            RequestError: Raised if the public key request to the api failed
 
         Returns:
             str: Encrypted bot token as a base64 string
 
         """
-        global PUBLIC_KEY
+        cache = encrypted_bot_id_cache
 
-        if PUBLIC_KEY is None or request_key:
-            PUBLIC_KEY = self._get_public_key()
+        async with cache.key_lock:
+            # Key could have been refreshed by another login while waiting for the lock
+            if cache.public_key is None or (
+                key_received_before is not None
+                and cache.time_key_received < key_received_before
+            ):
+                cache.set_public_key(await self._get_public_key())
+
+        return cache.get()
+
+
+class EncryptedBotIdCache:
+    """Cache of the bot token encrypted with the api's public key
+
+    Encrypted token is stored by the fingerprint of the key it was encrypted with and
+    is reused for every login until the key changes.
+
+    Attributes:
+        public_key: Current public key of the api, None until received
+        fingerprint (str): SHA-256 of the current public key
+        time_key_received (float): Time when the current public key was set
+        key_lock (asyncio.Lock): Lock to request the public key once at a time
+        encrypted (dict): Encrypted bot token with key fingerprints as keys
+        key_updates (int): Number of times the public key was set
+        encryptions (int): Number of RSA encryptions done
+        encryption_seconds (float): Total time spent on RSA encryptions
+        hits (int): Number of times the cached encrypted token was used
+    """
 
-        encrypted_data = PUBLIC_KEY.encrypt(
+    def __init__(self):
+        self.public_key = None
+        self.fingerprint = None
+        self.time_key_received = 0.0
+        self.key_lock = asyncio.Lock()
+        self.encrypted = {}
+        self.key_updates = 0
+        self.encryptions = 0
+        self.encryption_seconds = 0.0
+        self.hits = 0
+
+    def set_public_key(self, public_key):
+        """Set a new public key, drop tokens encrypted with an old one"""
+        fingerprint = hashlib.sha256(
+            public_key.public_bytes(
+                serialization.Encoding.DER,
+                serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+        ).hexdigest()
+
+        if fingerprint != self.fingerprint:
+            self.encrypted.clear()
+            logging.info("Public key changed, fingerprint: %s", fingerprint)
+
+        self.public_key = public_key
+        self.fingerprint = fingerprint
+        self.time_key_received = time()
+        self.key_updates += 1
+
+    def get(self) -> str:
+        """Return bot token encrypted with the current public key as a base64 string
+
+        The public key has to be set with `set_public_key()` first.
+        """
+        encrypted_data_base64 = self.encrypted.get(self.fingerprint)
+        if encrypted_data_base64 is not None:
+            self.hits += 1
+            return encrypted_data_base64
+
+        start = perf_counter()
+        encrypted_data = self.public_key.encrypt(
             BOT_TOKEN.encode("utf-8"),
             padding.OAEP(
                 mgf=padding.MGF1(algorithm=hashes.SHA256()),
@@ -164,10 +536,28 @@ class CustomSession(requests.Session):
             ),
         )
         encrypted_data_base64 = base64.b64encode(encrypted_data).decode("utf-8")
+        elapsed = perf_counter() - start
+
+        self.encryptions += 1
+        self.encryption_seconds += elapsed
+        self.encrypted[self.fingerprint] = encrypted_data_base64
 
-        logging.info("Bot id successfully encrypted")
+        logging.info("Bot id successfully encrypted in %.2f ms", elapsed * 1000)
         return encrypted_data_base64
 
+    def stats(self) -> dict:
+        """Return counters and timings of the cache"""
+        return {
+            "fingerprint": self.fingerprint,
+            "key_updates": self.key_updates,
+            "encryptions": self.encryptions,
+            "encryption_seconds": self.encryption_seconds,
+            "hits": self.hits,
+        }
+
+
+encrypted_bot_id_cache = EncryptedBotIdCache()
+
 
 class AdminSession(CustomSession):
     """Extend `CustomSession` class with admin specific properties and methods"""
@@ -175,99 +565,126 @@ class AdminSession(CustomSession):
     def __init__(self):
         super().__init__(BOT_TOKEN)
 
-    def login(self, encrypted_bot_id) -> bool:
+    async def login(self, encrypted_bot_id) -> bool:
         """Logs in session to the api as admin with the given `encrypted_bot_id`
 
         Args:
             encrypted_bot_id (str): Bot id encrypted with the public key
 
         Raises:
-            RequestException: Raised if the request to the api failed
+            RequestError: Raised if the request to the api failed
 
         Returns:
             bool: True if the login was successful
         """
         try:
-            login_response = self.get(
-                "http://127.0.0.1:8080/admin/login",
-                params={"encrypted_bot_id": encrypted_bot_id},
+            login_response = await self.send(
+                self.build_request(
+                    "GET",
+                    f"{API_URL}/admin/login",
+                    params={"encrypted_bot_id": encrypted_bot_id},
+                )
             )
             login_response.raise_for_status()
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to login as admin to the api: {e}")
-            raise RequestException("Failed to login to api")
+        except httpx.HTTPError as e:
+            logging.error("Failed to login as admin to the api: %s", e)
+            api_logins_total.labels("failure").inc()
+            raise RequestError("Failed to login to api")
 
         csrf_access_token = self.cookies["csrf_access_token"]
         self.headers.update({"X-CSRF-TOKEN": csrf_access_token})
+        self.time_created = time()
 
         logging.info("Admin successfully logged in to the api")
+        api_logins_total.labels("success").inc()
         return True
 
 
-def post_request(user_id, data_json) -> requests.Response:
+@observed
+async def post_request(user_id, data_json) -> httpx.Response:
     """Post request to the api with the given user id and data
 
     Doesn't handle exceptions, raises them to the caller.
+    Cached birthdays of the user are updated if the request succeeds.
 
     Args:
         user_id (str): id of the user
         data_json (dict): data to be posted
 
     Returns:
-        requests.Response: Response object of the post request
+        httpx.Response: Response object of the post request
 
     """
-    user_session = session_manager.get_session(user_id)
+    user_session = await session_manager.get_session(user_id)
+
+    logging.info("Posting a birthday from user: %s", user_id)
+    post_response = await user_session.post(f"{API_URL}/birthdays", json=data_json)
 
-    logging.info(f"Posting data: {data_json} from user: {user_id}")
-    post_response = user_session.post("http://127.0.0.1:8080/birthdays", json=data_json)
+    if post_response.is_success:
+        try:
+            birthday = post_response.json()
+        except ValueError:
+            # The birthday was created, it's only missing from the cached list
+            birthday = None
+        if isinstance(birthday, dict) and "id" in birthday:
+            birthday_cache.add(user_id, {**data_json, **birthday})
+        else:
+            birthday_cache.invalidate(user_id)
 
     return post_response
 
 
-def get_request(user_id) -> requests.Response:
+@observed
+async def get_request(user_id) -> httpx.Response:
     """Get request to the api with the given user id
 
     Doesn't handle exceptions, raises them to the caller.
+    Request is conditional if the last response had ETag or Last-Modified.
 
     Args:
         user_id (str): id of the user
 
     Returns:
-        requests.Response: Response object of the get request
+        httpx.Response: Response object of the get request
     """
-    user_session = session_manager.get_session(user_id)
+    user_session = await session_manager.get_session(user_id)
 
-    logging.info(f"Getting data for user: {user_id}")
-    get_response = user_session.get("http://127.0.0.1:8080/birthdays")
+    logging.info("Getting data for user: %s", user_id)
+    get_response = await user_session.conditional_get(f"{API_URL}/birthdays")
 
     return get_response
 
 
-def get_by_id_request(user_id, birthday_id) -> requests.Response:
+@observed
+async def get_by_id_request(user_id, birthday_id) -> httpx.Response:
     """Get request to the api with the given user id and birthday id
 
     Doesn't handle exceptions, raises them to the caller.
+    Request is conditional if the last response had ETag or Last-Modified.
 
     Args:
         user_id (str): id of the user
         birthday_id (str): id of the birthday
 
     Returns:
-        requests.Response: Response object of the get request
+        httpx.Response: Response object of the get request
     """
-    user_session = session_manager.get_session(user_id)
+    user_session = await session_manager.get_session(user_id)
 
-    logging.info(f"Getting data for user: {user_id} with birthday_id: {birthday_id}")
-    get_response = user_session.get(f"http://127.0.0.1:8080/birthdays/{birthday_id}")
+    logging.info("Getting data for user: %s with birthday_id: %s", user_id, birthday_id)
+    get_response = await user_session.conditional_get(
+        f"{API_URL}/birthdays/{birthday_id}"
+    )
 
     return get_response
 
 
-def put_request(user_id, birthday_id, data_json) -> requests.Response:
+@observed
+async def put_request(user_id, birthday_id, data_json) -> httpx.Response:
     """Put request to the api with the given user id and data
 
     Doesn't handle exceptions, raises them to the caller.
+    Cached birthdays of the user are updated if the request succeeds.
 
     Args:
         user_id (str): id of the user
@@ -275,52 +692,186 @@ def put_request(user_id, birthday_id, data_json) -> requests.Response:
         data_json (dict): data to be put
 
     Returns:
-        requests.Response: Response object of the put request
+        httpx.Response: Response object of the put request
     """
-    user_session = session_manager.get_session(user_id)
+    user_session = await session_manager.get_session(user_id)
 
-    logging.info(f"Putting data: {data_json} from user: {user_id}")
-    put_response = user_session.put(
-        f"http://127.0.0.1:8080/birthdays/{birthday_id}", json=data_json
+    logging.info("Putting birthday: %s from user: %s", birthday_id, user_id)
+    put_response = await user_session.put(
+        f"{API_URL}/birthdays/{birthday_id}", json=data_json
     )
 
+    if put_response.is_success:
+        birthday_cache.update(user_id, int(birthday_id), data_json)
+
     return put_response
 
 
-def delete_request(user_id, birthday_id) -> requests.Response:
+@observed
+async def delete_request(user_id, birthday_id) -> httpx.Response:
     """Delete request to the api with the given user id and birthday id
 
     Doesn't handle exceptions, raises them to the caller.
+    Cached birthdays of the user are updated if the request succeeds.
 
     Args:
         user_id (str): id of the user
         birthday_id (str): id of the birthday
 
     Returns:
-        requests.Response: Response object of the delete request
+        httpx.Response: Response object of the delete request
     """
-    user_session = session_manager.get_session(user_id)
+    user_session = await session_manager.get_session(user_id)
 
-    logging.info(f"Deleting birthday with id: {birthday_id} from user: {user_id}")
-    delete_response = user_session.delete(
-        f"http://127.0.0.1:8080/birthdays/{birthday_id}"
-    )
+    logging.info("Deleting birthday with id: %s from user: %s", birthday_id, user_id)
+    delete_response = await user_session.delete(f"{API_URL}/birthdays/{birthday_id}")
+
+    if delete_response.is_success:
+        birthday_cache.remove(user_id, int(birthday_id))
 
     return delete_response
 
 
-def incoming_birthdays_request() -> requests.Response:
-    """Get request to the api as admin to get incoming birthdays
+async def get_birthdays(user_id) -> list:
+    """Return all birthdays of the user, from the cache if possible
+
+    Doesn't handle exceptions, raises them to the caller.
+
+    Args:
+        user_id (str): id of the user
+
+    Raises:
+        httpx.HTTPStatusError: Raised if the api responded with an error
+
+    Returns:
+        list: Birthdays of the user, empty if there are none
+    """
+    birthdays = birthday_cache.get(user_id)
+    if birthdays is not None:
+        return birthdays
+
+    response = await get_request(user_id)
+    if response.status_code == 404:
+        birthdays = []
+    else:
+        response.raise_for_status()
+        birthdays = response.json()
+
+    birthday_cache.set(user_id, birthdays)
+    return birthdays
+
+
+async def get_name_index(user_id) -> NameIndex:
+    """Return birthdays of the user sorted by name, load them if they are not cached
 
     Doesn't handle exceptions, raises them to the caller.
 
+    Args:
+        user_id (str): id of the user
+
+    Raises:
+        httpx.HTTPStatusError: Raised if the api responded with an error
+
     Returns:
-        requests.Response: Response object of the get request
+        NameIndex: Birthdays of the user sorted by name
     """
+    name_index = birthday_cache.get_name_index(user_id)
+    if name_index is None:
+        await get_birthdays(user_id)
+        name_index = birthday_cache.get_name_index(user_id)
+
+    return name_index
+
+
+async def get_date_index(user_id) -> DateIndex:
+    """Return birthdays of the user sorted by date, load them if they are not cached
+
+    Doesn't handle exceptions, raises them to the caller.
+
+    Args:
+        user_id (str): id of the user
 
-    admin_session = session_manager.get_session(BOT_TOKEN)
+    Raises:
+        httpx.HTTPStatusError: Raised if the api responded with an error
 
-    logging.info("Getting incoming birthdays")
-    response = admin_session.get("http://127.0.0.1:8080/admin/birthdays/incoming")
+    Returns:
+        DateIndex: Birthdays of the user sorted by date
+    """
+    date_index = birthday_cache.get_date_index(user_id)
+    if date_index is None:
+        await get_birthdays(user_id)
+        date_index = birthday_cache.get_date_index(user_id)
+
+    return date_index
+
+
+async def get_birthday(user_id, birthday_id) -> dict:
+    """Return the birthday of the user, from the cache if possible
+
+    Doesn't handle exceptions, raises them to the caller.
+
+    Args:
+        user_id (str): id of the user
+        birthday_id (str): id of the birthday
+
+    Raises:
+        httpx.HTTPStatusError: Raised if the api responded with an error
+
+    Returns:
+        dict: The birthday
+    """
+    birthday = birthday_cache.get_birthday(user_id, int(birthday_id))
+    if birthday is not None:
+        return birthday
+
+    response = await get_by_id_request(user_id, birthday_id)
+    response.raise_for_status()
+    return response.json()
+
+
+async def incoming_birthdays_stream():
+    """Get incoming birthdays from the api as admin, yield them one by one
+
+    The response is parsed while it is being downloaded, so the whole list is never
+    held in memory. No birthdays are yielded if the api responds with 404.
+
+    Doesn't handle exceptions, raises them to the caller.
+
+    Raises:
+        httpx.HTTPStatusError: Raised if the api responded with an error
+        ValueError: Raised if the response is not a valid JSON array
+
+    Yields:
+        dict: Incoming birthday
+    """
+    admin_session = await session_manager.get_session(BOT_TOKEN)
+
+    logging.info("Streaming incoming birthdays")
+    for attempt in range(2):
+        request = admin_session.build_request(
+            "GET", f"{API_URL}/admin/birthdays/incoming"
+        )
+        sent_at = admin_session.last_used = time()
+        start = perf_counter()
+        response = await admin_session.send(request, stream=True)
+        # Time until the response headers, the body is read while it is being parsed
+        api_request_seconds.labels("incoming_birthdays_stream").observe(
+            perf_counter() - start
+        )
+        api_responses_total.labels(
+            "incoming_birthdays_stream", str(response.status_code)
+        ).inc()
+        try:
+            if response.status_code == 401 and attempt == 0:
+                logging.info("Admin session is unauthorized. Relogging")
+                await admin_session.relogin(response_time=sent_at)
+                continue
+            if response.status_code == 404:
+                return
+            response.raise_for_status()
 
-    return response
+            async for birthday in iter_json_array(response.aiter_text()):
+                yield birthday
+            return
+        finally:
+            await response.aclose()
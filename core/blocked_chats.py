@@ -0,0 +1,47 @@
+from datetime import datetime
+import logging
+
+from core.storage import BlockedChat
+
+
+class BlockedChats:
+    """Set of chats that blocked the bot, persisted in the `BlockedChat` table
+
+    Membership is checked in memory, the table is only written when a chat is added
+    or removed.
+
+    Attributes:
+        chats (set): Telegram ids of the blocked chats
+    """
+
+    def __init__(self):
+        self.chats = set()
+
+    def load(self):
+        """Load blocked chats from the database"""
+        self.chats = {row.telegram_id for row in BlockedChat.select()}
+        logging.info("Loaded %s blocked chats", len(self.chats))
+
+    def __contains__(self, telegram_id) -> bool:
+        return telegram_id in self.chats
+
+    def add(self, telegram_id):
+        """Mark the chat as blocked"""
+        if telegram_id in self.chats:
+            return
+        self.chats.add(telegram_id)
+        BlockedChat.insert(
+            telegram_id=telegram_id, blocked_at=datetime.now()
+        ).on_conflict_ignore().execute()
+        logging.info("Chat %s marked as blocked", telegram_id)
+
+    def discard(self, telegram_id):
+        """Remove the chat from blocked ones if it is there"""
+        if telegram_id not in self.chats:
+            return
+        self.chats.discard(telegram_id)
+        BlockedChat.delete_by_id(telegram_id)
+        logging.info("Chat %s is not blocked anymore", telegram_id)
+
+
+blocked_chats = BlockedChats()
@@ -0,0 +1,279 @@
+from collections import OrderedDict
+from time import time
+import logging
+
+from core.config import (
+    CACHE_TTL_SECONDS,
+    CACHE_MAX_BIRTHDAYS,
+    CACHE_MAX_RESPONSE_BYTES,
+)
+from core.index import NameIndex, DateIndex
+
+
+class CacheEntry:
+    """Cached birthdays of a user
+
+    Args:
+        birthdays: Birthdays of the user
+
+    Attributes:
+        time_loaded (float): Time the birthdays were loaded
+        birthdays (dict): Birthdays with their ids as keys
+        name_index (NameIndex): Birthdays sorted by name, built when first needed and
+          updated in place afterwards
+        date_index (DateIndex): Birthdays sorted by date, built when first needed and
+          updated in place afterwards
+    """
+
+    def __init__(self, birthdays):
+        self.time_loaded = time()
+        self.birthdays = {birthday["id"]: birthday for birthday in birthdays}
+        self.name_index = None
+        self.date_index = None
+
+    def get_name_index(self) -> NameIndex:
+        """Return the name index, build it if needed"""
+        if self.name_index is None:
+            self.name_index = NameIndex(self.birthdays.values())
+        return self.name_index
+
+    def get_date_index(self) -> DateIndex:
+        """Return the date index, build it if needed"""
+        if self.date_index is None:
+            self.date_index = DateIndex(self.birthdays.values())
+        return self.date_index
+
+    def index_add(self, birthday):
+        """Add the birthday to the built indexes"""
+        if self.name_index is not None:
+            self.name_index.add(birthday)
+        if self.date_index is not None:
+            self.date_index.add(birthday)
+
+    def index_remove(self, birthday):
+        """Remove the birthday from the built indexes"""
+        if self.name_index is not None:
+            self.name_index.remove(birthday)
+        if self.date_index is not None:
+            self.date_index.remove(birthday)
+
+
+class BirthdayCache:
+    """Cache of users' birthday lists
+
+    Lists are kept in least recently used order. A list expires `ttl` seconds after
+    it was loaded. When the total number of cached birthdays exceeds
+    `max_birthdays`, least recently used lists are evicted.
+
+    Should be updated after every successful change of birthdays through the api,
+    with `add()`, `update()`, `remove()` or `invalidate()`.
+
+    Args:
+        ttl (float): Seconds a loaded list stays valid
+        max_birthdays (int): Maximum number of birthdays of all users to keep
+
+    Attributes:
+        entries (OrderedDict): `CacheEntry` of the users with user ids as keys
+        size (int): Number of birthdays in the cache
+        hits (int): Number of times a valid list was found
+        misses (int): Number of times a list had to be loaded
+        evictions (int): Number of lists evicted because of `max_birthdays`
+    """
+
+    def __init__(self, ttl=CACHE_TTL_SECONDS, max_birthdays=CACHE_MAX_BIRTHDAYS):
+        self.ttl = ttl
+        self.max_birthdays = max_birthdays
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _get_entry(self, user_id) -> CacheEntry:
+        """Return valid entry of the user or None"""
+        entry = self.entries.get(user_id)
+        if entry is None:
+            return None
+
+        if time() - entry.time_loaded > self.ttl:
+            self.invalidate(user_id)
+            return None
+
+        self.entries.move_to_end(user_id)
+        return entry
+
+    def get(self, user_id):
+        """Return cached list of user's birthdays, None if it's not cached or expired"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        return list(entry.birthdays.values())
+
+    def get_birthday(self, user_id, birthday_id):
+        """Return cached birthday of the user, None if it's not cached"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return None
+        return entry.birthdays.get(birthday_id)
+
+    def get_name_index(self, user_id) -> NameIndex:
+        """Return user's birthdays sorted by name, None if they are not cached"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return None
+        return entry.get_name_index()
+
+    def get_date_index(self, user_id) -> DateIndex:
+        """Return user's birthdays sorted by date, None if they are not cached"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return None
+        return entry.get_date_index()
+
+    def set(self, user_id, birthdays):
+        """Store the list of user's birthdays"""
+        self.invalidate(user_id)
+
+        self.entries[user_id] = CacheEntry(birthdays)
+        self.size += len(birthdays)
+
+        while self.size > self.max_birthdays and len(self.entries) > 1:
+            evicted_id, evicted = self.entries.popitem(last=False)
+            self.size -= len(evicted.birthdays)
+            self.evictions += 1
+            logging.debug("Birthdays of user %s evicted from cache", evicted_id)
+
+    def add(self, user_id, birthday):
+        """Add a new birthday to the cached list of the user, if it's cached"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return
+
+        old_birthday = entry.birthdays.get(birthday["id"])
+        if old_birthday is None:
+            self.size += 1
+        entry.birthdays[birthday["id"]] = birthday
+
+        if old_birthday is not None:
+            entry.index_remove(old_birthday)
+        entry.index_add(birthday)
+
+    def update(self, user_id, birthday_id, data):
+        """Update fields of a cached birthday, drop user's list if it's not there"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return
+
+        if birthday_id not in entry.birthdays:
+            self.invalidate(user_id)
+            return
+
+        old_birthday = entry.birthdays[birthday_id]
+        birthday = {**old_birthday, **data, "id": birthday_id}
+        entry.birthdays[birthday_id] = birthday
+
+        entry.index_remove(old_birthday)
+        entry.index_add(birthday)
+
+    def remove(self, user_id, birthday_id):
+        """Remove the birthday from the cached list of the user"""
+        entry = self._get_entry(user_id)
+        if entry is None:
+            return
+
+        birthday = entry.birthdays.pop(birthday_id, None)
+        if birthday is not None:
+            self.size -= 1
+            entry.index_remove(birthday)
+
+    def invalidate(self, user_id):
+        """Drop the cached list of the user"""
+        entry = self.entries.pop(user_id, None)
+        if entry is not None:
+            self.size -= len(entry.birthdays)
+
+    def stats(self) -> dict:
+        """Return size of the cache and its counters"""
+        return {
+            "users": len(self.entries),
+            "birthdays": self.size,
+            "max_birthdays": self.max_birthdays,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+birthday_cache = BirthdayCache()
+
+
+class ResponseCache:
+    """Bodies of api responses with ETag or Last-Modified, for conditional requests
+
+    Only the validators, content type and body of a response are kept, in least
+    recently used order. When the total size of the bodies exceeds `max_bytes`,
+    least recently used ones are evicted. Bodies larger than `max_bytes` are not
+    kept at all.
+
+    Args:
+        max_bytes (int): Maximum total size of the kept bodies
+
+    Attributes:
+        entries (OrderedDict): `(headers, content)` of the responses with
+          `(session id, url)` as keys
+        size (int): Total size of the kept bodies in bytes
+        evictions (int): Number of bodies evicted because of `max_bytes`
+    """
+
+    # Headers kept with the body
+    HEADERS = ("ETag", "Last-Modified", "Content-Type")
+
+    def __init__(self, max_bytes=CACHE_MAX_RESPONSE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+
+    def get(self, key):
+        """Return `(headers, content)` of the response, None if it's not kept"""
+        entry = self.entries.get(key)
+        if entry is not None:
+            self.entries.move_to_end(key)
+        return entry
+
+    def set(self, key, headers, content):
+        """Keep the validators and body of the response"""
+        self.invalidate(key)
+        if len(content) > self.max_bytes:
+            return
+
+        headers = {name: headers[name] for name in self.HEADERS if name in headers}
+        self.entries[key] = (headers, content)
+        self.size += len(content)
+
+        while self.size > self.max_bytes:
+            evicted_key, (_, evicted) = self.entries.popitem(last=False)
+            self.size -= len(evicted)
+            self.evictions += 1
+            logging.debug("Response %s evicted from cache", evicted_key)
+
+    def invalidate(self, key):
+        """Drop the kept response"""
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.size -= len(entry[1])
+
+    def stats(self) -> dict:
+        """Return size of the cache and its counters"""
+        return {
+            "responses": len(self.entries),
+            "bytes": self.size,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
+
+
+response_cache = ResponseCache()
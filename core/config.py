@@ -8,16 +8,58 @@ config_file_path = os.path.join(os.path.dirname(__file__), "..", "config.ini")
 config = configparser.ConfigParser()
 
 if not config.read(config_file_path):
-    logging.error(f"Configuration file {config_file_path} not found.")
+    logging.error("Configuration file %s not found.", config_file_path)
     raise FileNotFoundError(f"Configuration file {config_file_path} not found.")
 
 try:
     BOT_TOKEN = config["Main"]["bot_token"]
     CREATOR_ID = int(config["Main"]["creator_id"])
+    CONCURRENT_UPDATES = config.getint("Updates", "concurrency", fallback=32)
+    API_URL = config.get("Api", "url", fallback="http://127.0.0.1:8080").rstrip("/")
+    MAX_SESSIONS = config.getint("Api", "max_sessions", fallback=10000)
+    MAX_CONNECTIONS = config.getint("Api", "max_connections", fallback=100)
+    MAX_KEEPALIVE_CONNECTIONS = config.getint(
+        "Api", "max_keepalive_connections", fallback=20
+    )
+    KEEPALIVE_EXPIRY = config.getfloat("Api", "keepalive_expiry", fallback=5.0)
+    REMINDER_CONCURRENCY = config.getint("Reminder", "concurrency", fallback=8)
+    REMINDER_GLOBAL_RATE = config.getfloat("Reminder", "global_rate", fallback=25)
+    REMINDER_CHAT_RATE = config.getfloat("Reminder", "chat_rate", fallback=1)
+    REMINDER_DIGEST = config.getboolean("Reminder", "digest", fallback=False)
+    CACHE_TTL_SECONDS = config.getfloat("Cache", "ttl_seconds", fallback=300)
+    CACHE_MAX_BIRTHDAYS = config.getint("Cache", "max_birthdays", fallback=100000)
+    CACHE_MAX_RESPONSE_BYTES = config.getint(
+        "Cache", "max_response_bytes", fallback=16 * 1024 * 1024
+    )
+    DATABASE_PATH = config.get(
+        "Storage",
+        "database_path",
+        fallback=os.path.join(
+            os.path.dirname(__file__), "..", "data", "birthdaybot.db"
+        ),
+    )
+    LOG_LEVEL = config.get("Logging", "level", fallback="DEBUG").upper()
+    LOG_FORMAT = config.get("Logging", "format", fallback="text")
+    # Keep one of every N records of a category, e.g. `sample_reminder = 100`
+    LOG_SAMPLING = {
+        option.removeprefix("sample_"): config.getint("Logging", option)
+        for option in (
+            config.options("Logging") if config.has_section("Logging") else []
+        )
+        if option.startswith("sample_")
+    }
+    METRICS_HOST = config.get("Metrics", "host", fallback="127.0.0.1")
+    METRICS_PORT = config.getint("Metrics", "port", fallback=9108)
+    WATCHDOG_THRESHOLD_SECONDS = config.getfloat(
+        "Watchdog", "threshold_seconds", fallback=0.5
+    )
+    WATCHDOG_INTERVAL_SECONDS = config.getfloat(
+        "Watchdog", "interval_seconds", fallback=1.0
+    )
     logging.info("Config loaded successfully.")
 except KeyError as e:
-    logging.error(f"Missing key in configuration file: {e}")
+    logging.error("Missing key in configuration file: %s", e)
     raise
 except ValueError as e:
-    logging.error(f"Invalid value in configuration file: {e}")
+    logging.error("Invalid value in configuration file: %s", e)
     raise
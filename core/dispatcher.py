@@ -0,0 +1,235 @@
+from time import monotonic
+import asyncio
+import logging
+
+from telegram.error import Forbidden, RetryAfter
+
+from core.metrics import registry
+
+messages_total = registry.counter(
+    "birthdaybot_reminder_messages_total",
+    "Reminder messages by result: sent, blocked or failed",
+    labels=("status",),
+)
+messages_throttled_total = registry.counter(
+    "birthdaybot_reminder_messages_throttled_total",
+    "RetryAfter responses received while sending reminder messages",
+)
+
+
+class TokenBucket:
+    """Token bucket rate limiter
+
+    Args:
+        rate (float): Tokens added per second
+        capacity (float): Maximum number of tokens, i.e. allowed burst
+
+    Attributes:
+        rate (float): Tokens added per second
+        capacity (float): Maximum number of tokens
+        tokens (float): Tokens currently available
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = rate if capacity is None else capacity
+        self.tokens = self.capacity
+        self.updated = monotonic()
+
+    async def acquire(self):
+        """Wait until a token is available and take it"""
+        while True:
+            now = monotonic()
+            self.tokens = min(
+                self.capacity, self.tokens + (now - self.updated) * self.rate
+            )
+            self.updated = now
+
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class MessageDispatcher:
+    """Send Telegram messages concurrently within Telegram's rate limits
+
+    Messages are taken from an async iterator while earlier ones are being sent.
+    A global token bucket limits messages per second for the whole bot, and messages
+    to the same chat are spaced by `1 / chat_rate` seconds. On `RetryAfter` all
+    workers pause for the requested time and the message is retried.
+
+    Args:
+        bot (telegram.Bot): Bot to send messages with
+        concurrency (int): Number of messages sent at the same time
+        global_rate (float): Maximum messages per second for the whole bot
+        global_bucket (TokenBucket): Optional bucket shared with other dispatchers
+          running at the same time, used instead of one with `global_rate`
+        chat_rate (float): Maximum messages per second to one chat
+        max_retries (int): Maximum number of retries of one message after `RetryAfter`
+        on_result: Optional callback `on_result(message, status, error)` called after
+          every message with status `"sent"`, `"blocked"` or `"failed"`
+
+    Attributes:
+        sent (int): Number of messages sent
+        blocked (int): Number of messages not sent because the bot was blocked
+        failed (int): Number of messages failed for other reasons
+        throttled (int): Number of `RetryAfter` responses received
+    """
+
+    def __init__(
+        self,
+        bot,
+        concurrency=8,
+        global_rate=25,
+        chat_rate=1,
+        max_retries=3,
+        on_result=None,
+        global_bucket=None,
+    ):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.global_bucket = (
+            global_bucket if global_bucket is not None else TokenBucket(global_rate)
+        )
+        self.chat_interval = 1 / chat_rate
+        self.max_retries = max_retries
+        self.on_result = on_result
+
+        self.chat_next_send = {}
+        self.paused_until = 0.0
+
+        self.sent = 0
+        self.blocked = 0
+        self.failed = 0
+        self.throttled = 0
+
+    async def run(self, messages) -> dict:
+        """Send all messages, return statistics of the run.
+
+        Args:
+            messages: Async iterator of `(chat_id, text, data)` tuples. `data` is passed
+              to `on_result` as is
+
+        Raises:
+            Exception: Raised if `messages` raised. Messages taken before are still sent
+            RuntimeError: Raised if all workers stopped before every message was taken
+
+        Returns:
+            dict: Number of sent/blocked/failed/throttled messages, duration and rate
+        """
+        start = monotonic()
+        queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        workers = [
+            asyncio.create_task(self._worker(queue)) for _ in range(self.concurrency)
+        ]
+
+        try:
+            async for message in messages:
+                if not await self._put(queue, message, workers):
+                    raise RuntimeError("All dispatcher workers stopped")
+        except asyncio.CancelledError:
+            for worker in workers:
+                worker.cancel()
+            raise
+        finally:
+            for _ in workers:
+                if not await self._put(queue, None, workers):
+                    break
+            for result in await asyncio.gather(*workers, return_exceptions=True):
+                if isinstance(result, Exception):
+                    logging.error("Dispatcher worker stopped: %r", result)
+
+            stats = self.stats(monotonic() - start)
+            logging.info("Dispatched messages: %s", stats)
+
+        return stats
+
+    def stats(self, seconds) -> dict:
+        """Return counters of the run that took `seconds`"""
+        return {
+            "sent": self.sent,
+            "blocked": self.blocked,
+            "failed": self.failed,
+            "throttled": self.throttled,
+            "seconds": round(seconds, 3),
+            "messages_per_second": round(self.sent / seconds, 2) if seconds else 0.0,
+        }
+
+    async def _put(self, queue, item, workers) -> bool:
+        """Put the item in the queue, return False if all workers stopped first"""
+        put = asyncio.ensure_future(queue.put(item))
+        try:
+            running = [worker for worker in workers if not worker.done()]
+            while not put.done():
+                if not running:
+                    return False
+                await asyncio.wait([put, *running], return_when=asyncio.FIRST_COMPLETED)
+                running = [worker for worker in running if not worker.done()]
+            return True
+        finally:
+            put.cancel()
+
+    async def _worker(self, queue):
+        while True:
+            message = await queue.get()
+            if message is None:
+                return
+            await self._send(message)
+
+    async def _wait_chat(self, chat_id):
+        """Reserve the next send slot of the chat and wait for it"""
+        now = monotonic()
+        send_at = max(now, self.chat_next_send.get(chat_id, 0.0))
+        self.chat_next_send[chat_id] = send_at + self.chat_interval
+        if send_at > now:
+            await asyncio.sleep(send_at - now)
+
+    async def _send(self, message):
+        chat_id, text, data = message
+        error = None
+
+        for attempt in range(self.max_retries + 1):
+            await self._wait_chat(chat_id)
+
+            pause = self.paused_until - monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+            await self.global_bucket.acquire()
+
+            try:
+                await self.bot.send_message(
+                    chat_id=chat_id, text=text, parse_mode="Markdown"
+                )
+                status = "sent"
+                self.sent += 1
+                break
+            except RetryAfter as e:
+                self.throttled += 1
+                messages_throttled_total.inc()
+                error = e
+                retry_after = e.retry_after
+                if not isinstance(retry_after, (int, float)):
+                    retry_after = retry_after.total_seconds()
+                self.paused_until = max(self.paused_until, monotonic() + retry_after)
+                logging.warning("Flood limit exceeded, pausing for %ss", retry_after)
+            except Forbidden as e:
+                status, error = "blocked", e
+                self.blocked += 1
+                break
+            except Exception as e:
+                status, error = "failed", e
+                self.failed += 1
+                break
+        else:
+            status = "failed"
+            self.failed += 1
+
+        messages_total.labels(status).inc()
+        if self.on_result is not None:
+            try:
+                self.on_result(data, status, error)
+            except Exception as e:
+                # e.g. the database is locked, the other messages are still sent
+                logging.exception("Failed to handle result of a message: %s", e)
@@ -0,0 +1,169 @@
+from bisect import bisect_left, insort
+from calendar import isleap
+from datetime import date, timedelta
+
+
+class NameIndex:
+    """Birthdays of a user sorted by name, case-insensitive
+
+    Supports searching by the beginning of the name with binary search and is
+    updated in place when birthdays are added, renamed or removed.
+
+    Args:
+        birthdays: Birthdays to index
+
+    Attributes:
+        entries (list): `(folded name, name, id)` of the birthdays, sorted
+    """
+
+    def __init__(self, birthdays):
+        self.entries = sorted(
+            (birthday["name"].casefold(), birthday["name"], birthday["id"])
+            for birthday in birthdays
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def page(self, page, page_size) -> list:
+        """Return `(name, id)` of the birthdays on the page, counting from 0"""
+        return [
+            (name, id)
+            for _, name, id in self.entries[page * page_size : (page + 1) * page_size]
+        ]
+
+    def search(self, prefix) -> "NameSearch":
+        """Return birthdays whose name starts with `prefix`, case-insensitive"""
+        prefix = prefix.casefold()
+        start = bisect_left(self.entries, (prefix,))
+        end = bisect_left(self.entries, (prefix + "\U0010ffff",), start)
+        return NameSearch(self, start, end)
+
+    def add(self, birthday):
+        """Add the birthday to the index"""
+        insort(
+            self.entries,
+            (birthday["name"].casefold(), birthday["name"], birthday["id"]),
+        )
+
+    def remove(self, birthday):
+        """Remove the birthday from the index"""
+        entry = (birthday["name"].casefold(), birthday["name"], birthday["id"])
+        position = bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+
+class NameSearch:
+    """Continuous range of a `NameIndex` with the same name prefix
+
+    Args:
+        name_index (NameIndex): Index the range is in
+        start (int): Position of the first birthday in the range
+        end (int): Position after the last birthday in the range
+    """
+
+    def __init__(self, name_index, start, end):
+        self.name_index = name_index
+        self.start = start
+        self.end = end
+
+    def __len__(self):
+        return self.end - self.start
+
+    def page(self, page, page_size) -> list:
+        """Return `(name, id)` of the birthdays on the page, counting from 0"""
+        start = self.start + page * page_size
+        end = min(start + page_size, self.end)
+        return [(name, id) for _, name, id in self.name_index.entries[start:end]]
+
+
+def birthday_date(month, day, year) -> date:
+    """Return date of the birthday in the year, Feb 29 is on Mar 1 in non-leap years"""
+    if (month, day) == (2, 29) and not isleap(year):
+        return date(year, 3, 1)
+    return date(year, month, day)
+
+
+def start_key(today) -> tuple:
+    """Return `(month, day)` of the first birthday that is today or later
+
+    In non-leap years birthdays on Feb 29 are on Mar 1, so they start on Mar 1 too.
+    """
+    if (today.month, today.day) == (3, 1) and not isleap(today.year):
+        return 2, 29
+    return today.month, today.day
+
+
+class DateIndex:
+    """Birthdays of a user sorted by day of the year
+
+    Finds where today is in the year with binary search, so the list can be read
+    starting from any date without sorting it again. Updated in place when
+    birthdays are added, changed or removed.
+
+    Args:
+        birthdays: Birthdays to index
+
+    Attributes:
+        entries (list): `(month, day, id, birthday)` of the birthdays, sorted
+    """
+
+    def __init__(self, birthdays):
+        self.entries = sorted(
+            (birthday["month"], birthday["day"], birthday["id"], birthday)
+            for birthday in birthdays
+        )
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __iter__(self):
+        """Iterate over birthdays from January to December"""
+        return (entry[3] for entry in self.entries)
+
+    def position(self, month, day) -> int:
+        """Return position of the first birthday on or after the date"""
+        return bisect_left(self.entries, (month, day))
+
+    def upcoming(self, count, today) -> list:
+        """Return up to `count` birthdays starting from today, wrapping to January"""
+        start = self.position(*start_key(today))
+        entries = self.entries[start : start + count]
+        if len(entries) < count:
+            entries += self.entries[: min(count - len(entries), start)]
+        return [entry[3] for entry in entries]
+
+    def within(self, days, today) -> list:
+        """Return birthdays from today to `days` days after it, in that order
+
+        The range wraps to January if it passes the end of the year. Birthdays on
+        Feb 29 are on Mar 1 in non-leap years.
+        """
+        if days >= 365:
+            return self.upcoming(len(self.entries), today)
+
+        end = today + timedelta(days=days)
+        start = start_key(today)
+        start_position = self.position(*start)
+        end_position = self.position(end.month, end.day + 1)
+
+        if (end.month, end.day) >= start:
+            entries = self.entries[start_position:end_position]
+        else:
+            entries = self.entries[start_position:] + self.entries[:end_position]
+        return [entry[3] for entry in entries]
+
+    def add(self, birthday):
+        """Add the birthday to the index"""
+        insort(
+            self.entries,
+            (birthday["month"], birthday["day"], birthday["id"], birthday),
+        )
+
+    def remove(self, birthday):
+        """Remove the birthday from the index"""
+        key = (birthday["month"], birthday["day"], birthday["id"])
+        position = bisect_left(self.entries, key)
+        if position < len(self.entries) and self.entries[position][:3] == key:
+            del self.entries[position]
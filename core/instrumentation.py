@@ -0,0 +1,89 @@
+from contextvars import ContextVar
+from functools import wraps
+from itertools import chain
+from time import perf_counter
+import logging
+
+from telegram import Update
+from telegram.ext import Application, BaseHandler, ConversationHandler
+
+from core.metrics import registry
+
+# Fields added to every record logged in the current context by `core.logger`,
+# e.g. the user's id and the handler's name while an update is handled
+log_context = ContextVar("log_context", default={})
+
+handler_seconds = registry.histogram(
+    "birthdaybot_handler_seconds",
+    "Time taken by handler callbacks",
+    labels=("handler",),
+)
+
+
+def handler_name(callback) -> str:
+    """Return name of the callback with its module, e.g. `add.skip_note`"""
+    return f"{callback.__module__.rsplit('.', 1)[-1]}.{callback.__name__}"
+
+
+def instrumented(callback):
+    """Wrap a handler callback to log in its context and measure it
+
+    Records logged while the callback runs get the user's id and the handler's name.
+    Time taken by the callback is logged with the `handler` category and observed in
+    `handler_seconds`.
+    """
+    name = handler_name(callback)
+    seconds = handler_seconds.labels(name)
+
+    @wraps(callback)
+    async def wrapper(update, context):
+        user = update.effective_user if isinstance(update, Update) else None
+        token = log_context.set({"user_id": user.id if user else None, "handler": name})
+        start = perf_counter()
+        try:
+            return await callback(update, context)
+        finally:
+            elapsed = perf_counter() - start
+            seconds.observe(elapsed)
+            latency_ms = round(elapsed * 1000, 3)
+            logging.debug(
+                "Handled update with %s in %s ms",
+                name,
+                latency_ms,
+                extra={"category": "handler", "latency_ms": latency_ms},
+            )
+            log_context.reset(token)
+
+    wrapper.instrumented = True
+    return wrapper
+
+
+def instrument_handler(handler: BaseHandler):
+    """Wrap callback of the handler, or of every handler of a conversation"""
+    if isinstance(handler, ConversationHandler):
+        for nested in chain(
+            handler.entry_points, *handler.states.values(), handler.fallbacks
+        ):
+            instrument_handler(nested)
+    elif not getattr(handler.callback, "instrumented", False):
+        handler.callback = instrumented(handler.callback)
+
+
+def instrument_handlers(application: Application):
+    """Wrap callbacks of all handlers added to the application with `instrumented()`"""
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            instrument_handler(handler)
+
+
+def running_handler(frame):
+    """Return name of the instrumented handler running in the frame's stack, or None
+
+    Used to find the handler that blocks the event loop from another thread.
+    """
+    while frame is not None:
+        code = frame.f_code
+        if code.co_name == "wrapper" and code.co_filename == __file__:
+            return frame.f_locals.get("name")
+        frame = frame.f_back
+    return None
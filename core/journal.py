@@ -0,0 +1,66 @@
+import logging
+
+from core.storage import db, Delivery
+
+
+class DeliveryJournal:
+    """Journal of reminders delivered on a date
+
+    Results are written to the `Delivery` table in batches. Reminders already sent on
+    the date are kept in memory, so a rerun of the reminder job after a restart skips
+    them with a set lookup.
+
+    Args:
+        date (datetime.date): Date of the reminder run
+        batch_size (int): Number of results to buffer before writing them
+
+    Attributes:
+        date (datetime.date): Date of the reminder run
+        delivered (set): `(birthday_id, telegram_id)` pairs already sent on the date
+        pending (list): Results not written to the database yet
+    """
+
+    def __init__(self, date, batch_size=100):
+        self.date = date
+        self.batch_size = batch_size
+        self.delivered = set()
+        self.pending = []
+
+    def load(self):
+        """Load reminders already sent on the date"""
+        query = Delivery.select(Delivery.birthday_id, Delivery.telegram_id).where(
+            (Delivery.date == self.date) & (Delivery.status == "sent")
+        )
+        self.delivered = {(row.birthday_id, row.telegram_id) for row in query}
+        logging.info(
+            "Loaded %s delivered reminders for %s", len(self.delivered), self.date
+        )
+
+    def is_delivered(self, birthday_id, telegram_id) -> bool:
+        """Check if the reminder was already sent on the date"""
+        return (birthday_id, telegram_id) in self.delivered
+
+    def record(self, birthday_id, telegram_id, status):
+        """Record the result of sending a reminder, write a batch if it's full"""
+        if status == "sent":
+            self.delivered.add((birthday_id, telegram_id))
+
+        self.pending.append(
+            {
+                "date": self.date,
+                "birthday_id": birthday_id,
+                "telegram_id": telegram_id,
+                "status": status,
+            }
+        )
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered results to the database"""
+        if not self.pending:
+            return
+
+        with db.atomic():
+            Delivery.insert_many(self.pending).execute()
+        self.pending = []
@@ -0,0 +1,76 @@
+import json
+
+
+decoder = json.JSONDecoder()
+WHITESPACE = " \t\n\r"
+# Characters that can follow a complete item of an array
+DELIMITERS = WHITESPACE + ",]"
+
+
+async def iter_json_array(chunks):
+    """Parse a JSON array from an async iterator of text chunks, yield its items
+
+    Items are yielded as soon as they are fully received, so only the current chunk
+    and the item being parsed are kept in memory.
+
+    Args:
+        chunks: Async iterator of `str` parts of a JSON array, e.g. `Response.aiter_text()`
+
+    Raises:
+        ValueError: Raised if the data is not a valid JSON array
+
+    Yields:
+        Decoded items of the array
+    """
+    buffer = ""
+    started = False
+    finished = False
+
+    async for chunk in chunks:
+        if finished:
+            if chunk.strip(WHITESPACE):
+                raise ValueError("Unexpected data after the end of JSON array")
+            continue
+
+        buffer += chunk
+        pos = 0
+
+        while True:
+            while pos < len(buffer) and buffer[pos] in WHITESPACE:
+                pos += 1
+            if pos == len(buffer):
+                break
+
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("Expected JSON array")
+                started = True
+                pos += 1
+                continue
+
+            if buffer[pos] == "]":
+                finished = True
+                pos += 1
+                if buffer[pos:].strip(WHITESPACE):
+                    raise ValueError("Unexpected data after the end of JSON array")
+                break
+            if buffer[pos] == ",":
+                pos += 1
+                continue
+
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                # Item is not complete yet, wait for the next chunk
+                break
+            if end == len(buffer) or buffer[end] not in DELIMITERS:
+                # A number could continue in the next chunk, e.g. `23.` before `5`
+                break
+
+            yield item
+            pos = end
+
+        buffer = buffer[pos:]
+
+    if not finished:
+        raise ValueError("Incomplete JSON array")
@@ -1,6 +1,12 @@
+import atexit
+import json
 import logging
-from logging.handlers import RotatingFileHandler
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 import os
+import queue
+
+from core.config import LOG_LEVEL, LOG_FORMAT, LOG_SAMPLING
+from core.instrumentation import log_context
 
 
 script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -9,41 +15,225 @@ log_dir = os.path.join(script_dir, "..", "logs")
 if not os.path.exists(log_dir):
     os.makedirs(log_dir)
 
+# Maximum number of records written between two flushes of the log files
+LOG_BATCH_SIZE = 256
+
+
+# Fields of records written by `JsonFormatter` in addition to time, level and message
+STRUCTURED_FIELDS = ("user_id", "handler", "latency_ms", "category")
+
+# Types of arguments that can be formatted later in the listener's thread
+IMMUTABLE_ARG_TYPES = (str, int, float, bool, type(None))
+
 
 class ExcludeGetUpdatesFilter(logging.Filter):
     def filter(self, record):
-        return "getUpdates" not in record.getMessage()
+        # Polling requests are only logged by httpx, other messages are not formatted
+        return record.name != "httpx" or "getUpdates" not in record.getMessage()
 
 
-logging.basicConfig(
-    level=logging.DEBUG, format="%(asctime)s - %(levelname)s - %(message)s"
-)
+class ContextFilter(logging.Filter):
+    """Add the fields of `log_context` to records"""
+
+    def filter(self, record):
+        for field, value in log_context.get().items():
+            if not hasattr(record, field):
+                setattr(record, field, value)
+        return True
+
+
+class SamplingFilter(logging.Filter):
+    """Keep one of every N records of a category, warnings and errors are always kept
+
+    Category of a record is its `category` field if set, e.g.
+    `logging.info(..., extra={"category": "reminder"})`, otherwise its logger's name.
+
+    Args:
+        sampling (dict): N with categories as keys. Categories not in it are kept
+
+    Attributes:
+        counters (dict): Number of records seen with categories as keys
+    """
+
+    def __init__(self, sampling):
+        super().__init__()
+        self.sampling = {
+            category: every for category, every in sampling.items() if every > 1
+        }
+        self.counters = dict.fromkeys(self.sampling, 0)
+
+    def filter(self, record):
+        if not self.sampling or record.levelno >= logging.WARNING:
+            return True
+
+        category = getattr(record, "category", record.name)
+        every = self.sampling.get(category)
+        if every is None:
+            return True
+
+        count = self.counters[category]
+        self.counters[category] = count + 1
+        return count % every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """Format records as JSON lines with time, level, logger, message and
+    `STRUCTURED_FIELDS` the record has"""
+
+    def format(self, record):
+        data = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                data[field] = value
+        if record.exc_info:
+            data["exception"] = self.formatException(record.exc_info)
+        return json.dumps(data, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """Queue handler that leaves formatting of messages to the listener's thread
+
+    Messages with only immutable arguments are formatted when they are written.
+    Other records are formatted before they are queued, as arguments could change
+    in the meantime.
+    """
+
+    def prepare(self, record):
+        if (
+            record.exc_info
+            or not isinstance(record.msg, str)
+            or not all(
+                isinstance(arg, IMMUTABLE_ARG_TYPES) for arg in (record.args or ())
+            )
+        ):
+            return super().prepare(record)
+        return record
 
-info_handler = RotatingFileHandler(
+
+class BatchedRotatingFileHandler(RotatingFileHandler):
+    """Rotating file handler that leaves flushing to `BatchingQueueListener`
+
+    Records are written to the file's buffer without a flush, and the file size is
+    counted instead of seeking to the end of the file before every record.
+
+    Attributes:
+        size (int): Current size of the log file in bytes
+    """
+
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, **kwargs)
+        self.size = (
+            os.path.getsize(self.baseFilename)
+            if os.path.exists(self.baseFilename)
+            else 0
+        )
+
+    def flush(self):
+        # Called by `emit()` after every record, files are flushed per batch instead
+        pass
+
+    def flush_batch(self):
+        """Flush records written since the last batch to the file"""
+        super().flush()
+
+    def shouldRollover(self, record) -> bool:
+        message_size = len(f"{self.format(record)}{self.terminator}".encode("utf-8"))
+        rollover = self.maxBytes > 0 and self.size + message_size >= self.maxBytes
+        # After a rollover the record is the first one in the new file
+        self.size = message_size if rollover else self.size + message_size
+        return rollover
+
+    def close(self):
+        self.flush_batch()
+        super().close()
+
+
+class BatchingQueueListener(QueueListener):
+    """Queue listener that writes records in batches from a background thread
+
+    Waits for a record, takes up to `LOG_BATCH_SIZE` more records that are already
+    queued, hands them to the handlers and flushes the handlers once per batch.
+    """
+
+    def _monitor(self):
+        while True:
+            records = [self.dequeue(True)]
+            while len(records) < LOG_BATCH_SIZE:
+                try:
+                    records.append(self.dequeue(False))
+                except queue.Empty:
+                    break
+
+            for record in records:
+                if record is self._sentinel:
+                    self.flush()
+                    return
+                self.handle(record)
+            self.flush()
+
+    def flush(self):
+        """Flush every handler of the listener"""
+        for handler in self.handlers:
+            if isinstance(handler, BatchedRotatingFileHandler):
+                handler.flush_batch()
+            else:
+                handler.flush()
+
+
+formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+file_formatter = JsonFormatter() if LOG_FORMAT == "json" else formatter
+
+console_handler = logging.StreamHandler()
+console_handler.setLevel(logging.DEBUG)
+console_handler.setFormatter(formatter)
+
+info_handler = BatchedRotatingFileHandler(
     os.path.join(log_dir, "info.log"), maxBytes=5 * 1024 * 1024, backupCount=3
 )
 info_handler.setLevel(logging.INFO)
-info_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-)
+info_handler.setFormatter(file_formatter)
 info_handler.addFilter(ExcludeGetUpdatesFilter())
 
-warning_handler = RotatingFileHandler(
+warning_handler = BatchedRotatingFileHandler(
     os.path.join(log_dir, "warning.log"), maxBytes=5 * 1024 * 1024, backupCount=3
 )
 warning_handler.setLevel(logging.WARNING)
-warning_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-)
+warning_handler.setFormatter(file_formatter)
 
-error_handler = RotatingFileHandler(
+error_handler = BatchedRotatingFileHandler(
     os.path.join(log_dir, "error.log"), maxBytes=5 * 1024 * 1024, backupCount=3
 )
 error_handler.setLevel(logging.ERROR)
-error_handler.setFormatter(
-    logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
+error_handler.setFormatter(file_formatter)
+
+# Log calls only put records in the queue, console and files are written by the listener
+log_queue = queue.SimpleQueue()
+
+log_listener = BatchingQueueListener(
+    log_queue,
+    console_handler,
+    info_handler,
+    warning_handler,
+    error_handler,
+    respect_handler_level=True,
 )
+log_listener.start()
+atexit.register(log_listener.stop)
+
+queue_handler = LazyQueueHandler(log_queue)
+# Sampled out records are dropped before they are formatted or queued
+queue_handler.addFilter(SamplingFilter(LOG_SAMPLING))
+queue_handler.addFilter(ContextFilter())
+
+# Replaces the default handler added if something was logged before this module ran
+logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler], force=True)
 
-logging.getLogger().addHandler(info_handler)
-logging.getLogger().addHandler(warning_handler)
-logging.getLogger().addHandler(error_handler)
+# httpx logs every request with its full url at INFO. Login urls carry the encrypted
+# bot token and Bot API urls carry the bot token, so they must not reach the logs
+logging.getLogger("httpx").setLevel(logging.WARNING)
@@ -0,0 +1,26 @@
+MESSAGE_MAX_LENGTH = 4096
+
+
+def chunk_lines(lines, limit=MESSAGE_MAX_LENGTH):
+    """Pack lines into as few texts of at most `limit` characters as possible
+
+    Lines are never split, a line longer than `limit` is yielded on its own.
+
+    Args:
+        lines: Iterable of lines, each ending with a newline
+
+    Yields:
+        str: Text of consecutive lines
+    """
+    chunk = []
+    length = 0
+    for line in lines:
+        if chunk and length + len(line) > limit:
+            yield "".join(chunk)
+            chunk = []
+            length = 0
+        chunk.append(line)
+        length += len(line)
+
+    if chunk:
+        yield "".join(chunk)
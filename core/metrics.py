@@ -0,0 +1,249 @@
+from bisect import bisect_left
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import asyncio
+import logging
+import threading
+
+# Upper bounds in seconds of the buckets of latency histograms
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def escape(value) -> str:
+    """Escape a label value for the Prometheus text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class Metric:
+    """Base of the metrics, a metric with labels keeps one child per label values
+
+    Children are created on first use with `labels()`. A metric without labels is
+    its own only child.
+
+    Args:
+        name (str): Name of the metric, e.g. `birthdaybot_api_requests_total`
+        help (str): Description of the metric
+        labels (tuple): Names of the labels
+
+    Attributes:
+        children (dict): Children with tuples of label values as keys
+    """
+
+    type = "untyped"
+
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.label_names = tuple(labels)
+        self.children = {}
+        if not self.label_names:
+            self.children[()] = self
+
+    def labels(self, *values):
+        """Return the child for the label values"""
+        child = self.children.get(values)
+        if child is None:
+            child = self.children[values] = self._child()
+        return child
+
+    def _child(self):
+        return type(self)(self.name, self.help)
+
+    def _label_text(self, values, extra=()) -> str:
+        pairs = [*zip(self.label_names, values), *extra]
+        if not pairs:
+            return ""
+        return "{" + ",".join(f'{n}="{escape(v)}"' for n, v in pairs) + "}"
+
+    def samples(self):
+        """Yield `(name, label text, value)` of every child"""
+        raise NotImplementedError
+
+    def render(self) -> str:
+        """Return the metric in the Prometheus text format"""
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        lines += [f"{name}{labels} {value}" for name, labels, value in self.samples()]
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    """Value that only goes up, or is read from `function` when rendered
+
+    Args:
+        function: Optional callable returning the current value, e.g. a counter
+          kept by another object
+    """
+
+    type = "counter"
+
+    def __init__(self, name, help, labels=(), function=None):
+        self.value = 0
+        self.function = function
+        super().__init__(name, help, labels)
+
+    def inc(self, amount=1):
+        self.value += amount
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            value = child.function() if child.function else child.value
+            yield self.name, self._label_text(values), value
+
+
+class Gauge(Metric):
+    """Value that goes up and down, or is read from `function` when rendered
+
+    Args:
+        function: Optional callable returning the current value
+    """
+
+    type = "gauge"
+
+    def __init__(self, name, help, labels=(), function=None):
+        self.value = 0
+        self.function = function
+        super().__init__(name, help, labels)
+
+    def set(self, value):
+        self.value = value
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            value = child.function() if child.function else child.value
+            yield self.name, self._label_text(values), value
+
+
+class Histogram(Metric):
+    """Distribution of observed values in buckets
+
+    Args:
+        buckets (tuple): Sorted upper bounds of the buckets
+
+    Attributes:
+        counts (list): Number of values in every bucket, the last one is `+Inf`
+        sum (float): Sum of the observed values
+        count (int): Number of observed values
+    """
+
+    type = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        super().__init__(name, help, labels)
+
+    def _child(self):
+        return Histogram(self.name, self.help, buckets=self.buckets)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def samples(self):
+        for values, child in list(self.children.items()):
+            cumulative = 0
+            for bound, count in zip((*self.buckets, "+Inf"), list(child.counts)):
+                cumulative += count
+                yield (
+                    f"{self.name}_bucket",
+                    self._label_text(values, [("le", bound)]),
+                    cumulative,
+                )
+            yield f"{self.name}_sum", self._label_text(values), child.sum
+            yield f"{self.name}_count", self._label_text(values), child.count
+
+
+class MetricsRegistry:
+    """Registry of the bot's metrics
+
+    Metrics are updated from the event loop's thread without locks and rendered
+    from the server's thread, so a scrape can see a histogram in the middle of
+    an update.
+
+    Attributes:
+        metrics (dict): Registered metrics with names as keys
+    """
+
+    def __init__(self):
+        self.metrics = {}
+
+    def register(self, metric):
+        """Add the metric, or return the already registered one with its name"""
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, help, labels=(), function=None) -> Counter:
+        return self.register(Counter(name, help, labels, function))
+
+    def gauge(self, name, help, labels=(), function=None) -> Gauge:
+        return self.register(Gauge(name, help, labels, function))
+
+    def histogram(self, name, help, labels=(), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def render(self) -> str:
+        """Return all metrics in the Prometheus text format"""
+        return "\n".join(metric.render() for metric in self.metrics.values()) + "\n"
+
+
+registry = MetricsRegistry()
+
+loop_lag_seconds = registry.histogram(
+    "birthdaybot_event_loop_lag_seconds",
+    "Delay of the event loop in running a callback scheduled by the watchdog",
+)
+loop_stalls_total = registry.counter(
+    "birthdaybot_event_loop_stalls_total",
+    "Times the event loop was blocked for longer than the watchdog threshold",
+    labels=("handler",),
+)
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    """Serve the registry's metrics on `/metrics`"""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        if self.path != "/metrics":
+            self.send_error(404)
+            return
+
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class MetricsServer:
+    """Server of the registry's metrics
+
+    Attributes:
+        server (ThreadingHTTPServer): Server running in a background thread
+    """
+
+    def __init__(self):
+        self.server = None
+
+    def start(self, host, port):
+        """Serve metrics on `http://host:port/metrics` from a background thread"""
+        self.server = ThreadingHTTPServer((host, port), MetricsHandler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        logging.info(
+            "Serving metrics on http://%s:%s/metrics", host, self.server.server_port
+        )
+
+    async def close(self):
+        """Stop the server"""
+        if self.server is not None:
+            await asyncio.to_thread(self.server.shutdown)
+            self.server.server_close()
+            self.server = None
+
+
+metrics_server = MetricsServer()
@@ -0,0 +1,89 @@
+import os
+
+from peewee import (
+    SqliteDatabase,
+    Model,
+    BigIntegerField,
+    CharField,
+    SmallIntegerField,
+    DateField,
+    DateTimeField,
+)
+
+from core.config import DATABASE_PATH
+
+
+db = SqliteDatabase(DATABASE_PATH, pragmas={"journal_mode": "wal"})
+
+
+class BaseModel(Model):
+    class Meta:
+        database = db
+
+
+class UserSettings(BaseModel):
+    """Settings of a user stored locally by the bot
+
+    Attributes:
+        telegram_id (BigIntegerField): Telegram id of the user
+        timezone (CharField): Name of the user's time zone, e.g. `Europe/Kyiv`
+        hour (SmallIntegerField): Hour of the day to send reminders at, in `timezone`
+    """
+
+    telegram_id = BigIntegerField(primary_key=True)
+    timezone = CharField(max_length=64)
+    hour = SmallIntegerField()
+
+
+class Delivery(BaseModel):
+    """Append-only journal of reminders sent or tried to be sent
+
+    Attributes:
+        date (DateField): Date of the reminder run
+        birthday_id (BigIntegerField): Id of the birthday the reminder is about
+        telegram_id (BigIntegerField): Telegram id of the user the reminder is sent to
+        status (CharField): `sent`, `blocked` or `failed`
+    """
+
+    date = DateField(index=True)
+    birthday_id = BigIntegerField()
+    telegram_id = BigIntegerField()
+    status = CharField(max_length=16)
+
+
+class BlockedChat(BaseModel):
+    """Chat that the bot failed to send a message to with `Forbidden`
+
+    Attributes:
+        telegram_id (BigIntegerField): Telegram id of the chat
+        blocked_at (DateTimeField): Time the bot was found blocked
+    """
+
+    telegram_id = BigIntegerField(primary_key=True)
+    blocked_at = DateTimeField()
+
+
+class ReminderRun(BaseModel):
+    """Reminder run of a `(timezone, hour)` bucket on a date
+
+    Attributes:
+        date (DateField): Date of the run in the bucket's time zone
+        bucket (CharField): Bucket as `timezone hour`
+        finished_at (DateTimeField): Time the run finished, None if it didn't
+    """
+
+    date = DateField()
+    bucket = CharField(max_length=72)
+    finished_at = DateTimeField(null=True)
+
+    class Meta:
+        indexes = ((("date", "bucket"), True),)
+
+
+def init_db():
+    """Create the database's directory if needed, connect and create missing tables"""
+    directory = os.path.dirname(db.database)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    db.connect(reuse_if_open=True)
+    db.create_tables([UserSettings, Delivery, BlockedChat, ReminderRun])
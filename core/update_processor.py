@@ -0,0 +1,65 @@
+import asyncio
+import sys
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+
+class PerUserUpdateProcessor(BaseUpdateProcessor):
+    """Process updates of different users concurrently, and of one user in order
+
+    Conversations keep their state and `context.user_data` per user, so two updates
+    of the same user must not be handled at the same time. Each user's updates wait
+    for a lock of that user, in the order they were received. Updates without a user
+    or chat are processed right away.
+
+    The semaphore of `BaseUpdateProcessor` is taken before `do_process_update()`,
+    so updates waiting for their user's lock would hold its slots, and one user
+    sending updates quickly could block all the others. The base class is given no
+    limit (`max_concurrent_updates` is `sys.maxsize`), updates are limited by
+    `semaphore` once their user's lock is taken instead.
+
+    Args:
+        max_concurrent_updates (int): Maximum number of updates processed at once
+
+    Attributes:
+        locks (dict): `[lock, number of updates using it]` with user or chat ids as keys
+        semaphore (asyncio.BoundedSemaphore): Limit of updates processed at once
+    """
+
+    def __init__(self, max_concurrent_updates):
+        if max_concurrent_updates < 1:
+            raise ValueError("`max_concurrent_updates` must be a positive integer!")
+        super().__init__(sys.maxsize)
+        self.semaphore = asyncio.BoundedSemaphore(max_concurrent_updates)
+        self.locks = {}
+
+    async def do_process_update(self, update, coroutine):
+        key = None
+        if isinstance(update, Update):
+            if update.effective_user is not None:
+                key = update.effective_user.id
+            elif update.effective_chat is not None:
+                key = update.effective_chat.id
+        if key is None:
+            async with self.semaphore:
+                await coroutine
+            return
+
+        entry = self.locks.get(key)
+        if entry is None:
+            entry = self.locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self.semaphore:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self.locks[key]
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
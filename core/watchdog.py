@@ -0,0 +1,99 @@
+from time import monotonic
+import logging
+import sys
+import threading
+import traceback
+
+from core.config import WATCHDOG_THRESHOLD_SECONDS, WATCHDOG_INTERVAL_SECONDS
+from core.instrumentation import running_handler
+from core.metrics import loop_lag_seconds, loop_stalls_total
+
+
+class LoopWatchdog:
+    """Thread that measures the event loop lag and reports what blocks the loop
+
+    Every `interval` seconds the watchdog schedules a callback on the loop and waits
+    for it to run. The delay is observed in `loop_lag_seconds`. If the callback
+    doesn't run within `threshold` seconds, the loop is blocked: the stack of the
+    loop's thread is sampled and logged with the name of the handler running in it.
+    Once the loop catches up, the total time it was blocked is logged too.
+
+    Args:
+        threshold (float): Seconds the loop can be blocked for without a warning
+        interval (float): Seconds between two measurements
+
+    Attributes:
+        loop (asyncio.AbstractEventLoop): Watched loop, None until started
+        loop_thread_id (int): Id of the thread running the loop
+        stalls (int): Number of times the loop was blocked for longer than `threshold`
+    """
+
+    def __init__(self, threshold=0.5, interval=1.0):
+        self.threshold = threshold
+        self.interval = interval
+        self.loop = None
+        self.loop_thread_id = None
+        self.thread = None
+        self.stopped = threading.Event()
+        self.beat = threading.Event()
+        self.stalls = 0
+
+    def start(self, loop):
+        """Start watching the loop, has to be called from the loop's thread"""
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.stopped.clear()
+        self.thread = threading.Thread(
+            target=self._run, name="loop-watchdog", daemon=True
+        )
+        self.thread.start()
+        logging.info(
+            "Watching the event loop, blocks longer than %ss are reported",
+            self.threshold,
+        )
+
+    def stop(self):
+        """Stop the watchdog's thread"""
+        self.stopped.set()
+        self.beat.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+
+    def _run(self):
+        while not self.stopped.wait(self.interval):
+            self.beat.clear()
+            try:
+                self.loop.call_soon_threadsafe(self._on_beat, monotonic())
+            except RuntimeError:
+                # The loop was closed
+                return
+
+            if self.beat.wait(self.threshold):
+                continue
+
+            self.stalls += 1
+            frame = sys._current_frames().get(self.loop_thread_id)
+            handler = running_handler(frame)
+            loop_stalls_total.labels(handler or "none").inc()
+            logging.warning(
+                "Event loop is blocked for more than %ss in handler %s. Stack:\n%s",
+                self.threshold,
+                handler,
+                "".join(traceback.format_stack(frame)) if frame else "unavailable",
+                extra={"handler": handler},
+            )
+            del frame
+
+            self.beat.wait()
+
+    def _on_beat(self, scheduled):
+        """Runs on the loop, `scheduled` is the time the watchdog scheduled it at"""
+        lag = monotonic() - scheduled
+        loop_lag_seconds.observe(lag)
+        if lag > self.threshold:
+            logging.warning("Event loop was blocked for %.3fs", lag)
+        self.beat.set()
+
+
+loop_watchdog = LoopWatchdog(WATCHDOG_THRESHOLD_SECONDS, WATCHDOG_INTERVAL_SECONDS)
@@ -24,7 +24,7 @@ birthdays_schema = BirthdaysSchema()
 
 async def add_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Ask for the person's name."""
-    logging.info(f"User {update.effective_user.id} is adding a birthday")
+    logging.info("User %s is adding a birthday", update.effective_user.id)
 
     context.user_data.clear()
 
@@ -45,13 +45,15 @@ async def add_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "That name is too long. Please choose a shorter one:"
         )
         logging.warning(
-            f"User {update.effective_user.id} entered a name that is too long: {name}"
+            "User %s entered a name that is too long: %s",
+            update.effective_user.id,
+            name,
         )
         print("returning ADD_NAME")
         return ADD_NAME
 
     context.user_data["name"] = name
-    logging.info(f"User {update.effective_user.id} entered name: {name}")
+    logging.info("User %s entered name: %s", update.effective_user.id, name)
 
     if context.user_data.get("day"):
         return await post_birthday(update, context)
@@ -69,7 +71,7 @@ async def add_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     """
     date_text = update.message.text
-    logging.info(f"User {update.effective_user.id} provided date: {date_text}")
+    logging.info("User %s provided date: %s", update.effective_user.id, date_text)
 
     try:
         ints_from_text = findall(r"\d+", date_text)
@@ -85,7 +87,7 @@ async def add_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["year"] = date_json["year"]
 
     except (ValueError, IndexError, ValidationError) as e:
-        logging.warning(f"Validation error for date: {date_text}. Error: {e}")
+        logging.warning("Validation error for date: %s. Error: %s", date_text, e)
         await update.message.reply_text(
             "\n".join(e.messages)
             if isinstance(e, ValidationError)
@@ -104,7 +106,7 @@ async def add_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def skip_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle skiping adding a note, call `post_birthday()`."""
-    logging.info(f"User {update.effective_user.id} skipped adding a note")
+    logging.info("User %s skipped adding a note", update.effective_user.id)
     context.user_data["note"] = None
     return await post_birthday(update, context)
 
@@ -112,7 +114,7 @@ async def skip_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def add_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Store note, call `post_birthday()`."""
     note = update.message.text
-    logging.info(f"User {update.effective_user.id} added a note: {note}")
+    logging.info("User %s added a note: %s", update.effective_user.id, note)
     context.user_data["note"] = note
     return await post_birthday(update, context)
 
@@ -139,12 +141,14 @@ async def post_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
 
     try:
-        response = post_request(update.effective_user.id, data)
+        response = await post_request(update.effective_user.id, data)
         if response.status_code != 422:
             response.raise_for_status()
     except Exception as e:
         logging.error(
-            f"Error posting birthday data for user {update.effective_user.id}: {str(e)}"
+            "Error posting birthday data for user %s: %s",
+            update.effective_user.id,
+            e,
         )
         await update.message.reply_text("Failed. Please try again")
         return ConversationHandler.END
@@ -153,7 +157,9 @@ async def post_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if response.status_code == 422:
         error_field = response.json().get("field")
         logging.warning(
-            f"Validation error from API for user {update.effective_user.id}: {response.json()}"
+            "Validation error from API for user %s: %s",
+            update.effective_user.id,
+            response.json(),
         )
 
         if error_field == "name":
@@ -175,7 +181,7 @@ async def post_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return ConversationHandler.END
 
     context.user_data.clear()
-    logging.info(f"Birthday added successfully for user {update.effective_user.id}")
+    logging.info("Birthday added successfully for user %s", update.effective_user.id)
     await update.message.reply_text(
         "Birthday added successfully! /list to see all birthdays"
     )
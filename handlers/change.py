@@ -1,7 +1,7 @@
 import logging
 from re import findall
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import (
     CommandHandler,
     ConversationHandler,
@@ -12,9 +12,18 @@ from telegram.ext import (
 )
 from marshmallow import ValidationError
 
-from core.api_requests import put_request, get_request, get_by_id_request
+from core.api_requests import put_request, get_name_index, get_birthday
 from core.schema import BirthdaysSchema
 from handlers.fallback import stop
+from handlers.pagination import (
+    birthdays_keyboard,
+    edit_keyboard,
+    page_from_query,
+    remember_search,
+    search_of,
+    PAGE_PATTERN,
+    SEARCH_HINT,
+)
 
 
 CHANGE_GET_BIRTHDAY, CHANGE_NAME, CHANGE_DATE, CHANGE_NOTE = range(4)
@@ -23,64 +32,111 @@ birthdays_schema = BirthdaysSchema()
 
 
 async def change_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Request all birthdays, give user a keyboard to choose which birthday to change."""
-    logging.info(f"User {update.effective_user.id} is changing a birthday")
+    """Get all birthdays, give user a keyboard to choose which birthday to change."""
+    logging.info("User %s is changing a birthday", update.effective_user.id)
 
     context.user_data.clear()
 
     try:
-        response = get_request(update.effective_user.id)
-        if response.status_code != 404:
-            response.raise_for_status()
-            data = response.json()
+        name_index = await get_name_index(update.effective_user.id)
         logging.info(
-            f"Retrieved {len(data)} birthdays for user {update.effective_user.id}"
+            "Retrieved %s birthdays for user %s",
+            len(name_index),
+            update.effective_user.id,
         )
     except Exception as e:
         logging.error(
-            f"Failed to retrieve birthdays for user {update.effective_user.id}: {e}"
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
         )
         await update.message.reply_text("Failed. Please try again")
         return ConversationHandler.END
 
-    if response.status_code == 404:
-        logging.warning(f"No birthdays found for user {update.effective_user.id}")
+    if not name_index:
+        logging.warning("No birthdays found for user %s", update.effective_user.id)
         await update.message.reply_text("No birthdays found. /add_birthday to add one")
         return ConversationHandler.END
 
-    data = sorted(data, key=lambda x: x["name"])
+    reply_markup = birthdays_keyboard(name_index)
+
+    await update.message.reply_text(
+        f"Choose whose birthday to change{SEARCH_HINT}", reply_markup=reply_markup
+    )
+    return CHANGE_GET_BIRTHDAY
+
+
+async def change_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Narrow the keyboard to birthdays whose name starts with the entered text."""
+    search = update.message.text
+    logging.info("User %s searched for: %s", update.effective_user.id, search)
+
+    try:
+        name_index = await get_name_index(update.effective_user.id)
+    except Exception as e:
+        logging.error(
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
+        )
+        await update.message.reply_text("Failed. Please try again")
+        return ConversationHandler.END
 
-    keyboard = []
-    for birthday in data:
-        keyboard.append(
-            [InlineKeyboardButton(birthday["name"], callback_data=birthday["id"])]
+    found = name_index.search(search)
+    if not found:
+        await update.message.reply_text(
+            "No one found. Type another name or its first letters:"
         )
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        return CHANGE_GET_BIRTHDAY
 
-    await update.message.reply_text(
-        "Choose whose birthday to change:", reply_markup=reply_markup
+    message = await update.message.reply_text(
+        "Choose whose birthday to change:", reply_markup=birthdays_keyboard(found)
     )
+    remember_search(context, message, search)
     return CHANGE_GET_BIRTHDAY
 
 
-async def change_get_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Request chosen birthday, ask for new name or to keep the same one."""
-    # HACK: Not optimal to request the birthday again, fix later
+async def change_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show another page of the keyboard to choose a birthday."""
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        name_index = await get_name_index(update.effective_user.id)
+    except Exception as e:
+        logging.error(
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
+        )
+        await query.edit_message_text("Failed. Please try again")
+        return ConversationHandler.END
+
+    await edit_keyboard(
+        query,
+        birthdays_keyboard(
+            name_index.search(search_of(context, query.message)),
+            page_from_query(query),
+        ),
+    )
+    return CHANGE_GET_BIRTHDAY
+
 
+async def change_get_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Get chosen birthday, ask for new name or to keep the same one."""
     query = update.callback_query
     await query.answer()
 
     birthday_id = query.data
-    logging.info(f"User {update.effective_user.id} selected birthday ID: {birthday_id}")
+    logging.info(
+        "User %s selected birthday ID: %s", update.effective_user.id, birthday_id
+    )
 
     try:
-        response = get_by_id_request(update.effective_user.id, birthday_id)
-        response.raise_for_status()
-        birthday_json = response.json()
-        logging.info(f"Retrieved birthday data for ID {birthday_id}: {birthday_json}")
+        birthday_json = await get_birthday(update.effective_user.id, birthday_id)
+        logging.info(
+            "Retrieved birthday data for ID %s: %s", birthday_id, birthday_json
+        )
     except Exception as e:
         logging.error(
-            f"Failed to retrieve birthday ID {birthday_id} for user {update.effective_user.id}: {e}"
+            "Failed to retrieve birthday ID %s for user %s: %s",
+            birthday_id,
+            update.effective_user.id,
+            e,
         )
         await query.edit_message_text(
             "Failed. Please try again. {traceback.format_exc()}"
@@ -95,7 +151,9 @@ async def change_get_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE
     context.user_data["note"] = birthday_json["note"]
 
     logging.info(
-        f"User {update.effective_user.id} will now edit birthday: {birthday_json['name']}"
+        "User %s will now edit birthday: %s",
+        update.effective_user.id,
+        birthday_json["name"],
     )
 
     await query.edit_message_text(
@@ -107,11 +165,13 @@ async def change_get_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE
 async def change_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check new name, ask for new date or to keep the same one."""
     new_name = update.message.text
-    logging.info(f"User {update.effective_user.id} entered new name: {new_name}")
+    logging.info("User %s entered new name: %s", update.effective_user.id, new_name)
 
     if len(new_name) > 255:
         logging.warning(
-            f"User {update.effective_user.id} entered a name that is too long: {new_name}"
+            "User %s entered a name that is too long: %s",
+            update.effective_user.id,
+            new_name,
         )
         await update.message.reply_text(
             "That name is too long. Please choose a shorter one or send /skip to keep the same name:"
@@ -119,7 +179,7 @@ async def change_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return CHANGE_NAME
     if new_name == context.user_data["name"]:
         logging.warning(
-            f"User {update.effective_user.id} entered the same name: {new_name}"
+            "User %s entered the same name: %s", update.effective_user.id, new_name
         )
         await update.message.reply_text(
             "This name is the same. Input a new name or send /skip to keep the same name:"
@@ -143,7 +203,7 @@ async def change_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def skip_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Not changing name, ask for new date or to keep the same one."""
-    logging.info(f"User {update.effective_user.id} chose to skip changing the name")
+    logging.info("User %s chose to skip changing the name", update.effective_user.id)
 
     if "new_day" in context.user_data or context.user_data.get("skipped_date"):
         return await put_birthday(update, context)
@@ -175,11 +235,11 @@ async def change_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
         context.user_data["new_year"] = date_json["year"]
 
         logging.info(
-            f"Validated new date for user {update.effective_user.id}: {date_json}"
+            "Validated new date for user %s: %s", update.effective_user.id, date_json
         )
 
     except (ValueError, IndexError, ValidationError) as e:
-        logging.warning(f"Validation error for date: {new_date_text}. Error: {e}")
+        logging.warning("Validation error for date: %s. Error: %s", new_date_text, e)
         await update.message.reply_text(
             "\n".join(e.messages)
             if isinstance(e, ValidationError)
@@ -201,7 +261,7 @@ async def change_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def skip_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Not changing date, ask for new note or to keep the same one."""
-    logging.info(f"User {update.effective_user.id} chose to skip changing the date")
+    logging.info("User %s chose to skip changing the date", update.effective_user.id)
 
     if "new_note" in context.user_data or context.user_data.get("skipped_note"):
         return await put_birthday(update, context)
@@ -220,11 +280,13 @@ async def skip_date(update: Update, context: ContextTypes.DEFAULT_TYPE):
 async def change_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Check new note, call `put_birthday()`."""
     new_note = update.message.text
-    logging.info(f"User {update.effective_user.id} entered new note: {new_note}")
+    logging.info("User %s entered new note: %s", update.effective_user.id, new_note)
 
     if len(new_note) > 255:
         logging.warning(
-            f"User {update.effective_user.id} entered a note that is too long: {new_note}"
+            "User %s entered a note that is too long: %s",
+            update.effective_user.id,
+            new_note,
         )
         await update.message.reply_text(
             "This note is too long. Please choose a shorter one. Send /skip to keep the same note, /delete_note to delete it:"
@@ -233,7 +295,7 @@ async def change_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     if new_note == context.user_data["note"]:
         logging.warning(
-            f"User {update.effective_user.id} entered the same note: {new_note}"
+            "User %s entered the same note: %s", update.effective_user.id, new_note
         )
         await update.message.reply_text(
             "This note is the same. Input a new note, /delete_note to delete it, or send /skip to keep the same note:"
@@ -246,7 +308,7 @@ async def change_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def skip_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Not changing note, call `put_birthday()`."""
-    logging.info(f"User {update.effective_user.id} chose to skip changing the note")
+    logging.info("User %s chose to skip changing the note", update.effective_user.id)
 
     context.user_data["skipped_note"] = True
     return await put_birthday(update, context)
@@ -254,7 +316,7 @@ async def skip_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def delete_note(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Set the note to None, call `put_birthday()`."""
-    logging.info(f"User {update.effective_user.id} chose to delete the note")
+    logging.info("User %s chose to delete the note", update.effective_user.id)
 
     context.user_data["new_note"] = None
     return await put_birthday(update, context)
@@ -275,22 +337,24 @@ async def put_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """
 
     if nothing_changed(context.user_data):
-        logging.warning(f"User {update.effective_user.id} didn't change anything")
+        logging.warning("User %s didn't change anything", update.effective_user.id)
         await update.message.reply_text("No changes made. Don't waste my time.")
         return ConversationHandler.END
 
     data_json = _collect_data(context.user_data)
 
     try:
-        response = put_request(
+        response = await put_request(
             update.effective_user.id, context.user_data["birthday_id"], data_json
         )
-        logging.info(f"Put request response: {response.json()}")
+        logging.info("Put request response status: %s", response.status_code)
         if response.status_code != 422:
             response.raise_for_status()
     except Exception as e:
         logging.error(
-            f"Error putting birthday data for user {update.effective_user.id}: {str(e)}"
+            "Error putting birthday data for user %s: %s",
+            update.effective_user.id,
+            e,
         )
         await update.message.reply_text("Failed. Please try again")
         context.user_data.clear()
@@ -322,12 +386,14 @@ async def put_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
             return CHANGE_DATE
         else:
             logging.warning(
-                f"Validation error from API for user {update.effective_user.id}: {response.json()}"
+                "Validation error from API for user %s: %s",
+                update.effective_user.id,
+                response.json(),
             )
             await update.message.reply_text("Invalid data. Please try again")
             return ConversationHandler.END
 
-    logging.info(f"User {update.effective_user.id} successfully changed birthday data")
+    logging.info("User %s successfully changed birthday data", update.effective_user.id)
     context.user_data.clear()
     await update.message.reply_text(
         "Birthday changed successfully! /list to see all birthdays"
@@ -375,7 +441,11 @@ def _collect_data(user_data) -> dict:
 change_conv_handler = ConversationHandler(
     entry_points=[CommandHandler("change", change_birthday)],
     states={
-        CHANGE_GET_BIRTHDAY: [CallbackQueryHandler(change_get_birthday, r"^[1-9]\d*$")],
+        CHANGE_GET_BIRTHDAY: [
+            CallbackQueryHandler(change_get_birthday, r"^[1-9]\d*$"),
+            CallbackQueryHandler(change_page, PAGE_PATTERN),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, change_search),
+        ],
         CHANGE_NAME: [
             MessageHandler(filters.TEXT & ~filters.COMMAND, change_name),
             CommandHandler("skip", skip_name),
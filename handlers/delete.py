@@ -1,16 +1,27 @@
 import logging
 
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+from telegram import Update
 from telegram.ext import (
     CommandHandler,
     ConversationHandler,
+    MessageHandler,
     ContextTypes,
+    filters,
     CallbackQueryHandler,
 )
 
-from core.api_requests import delete_request, get_request
+from core.api_requests import delete_request, get_name_index
 from core.schema import BirthdaysSchema
 from handlers.fallback import stop
+from handlers.pagination import (
+    birthdays_keyboard,
+    edit_keyboard,
+    page_from_query,
+    remember_search,
+    search_of,
+    PAGE_PATTERN,
+    SEARCH_HINT,
+)
 
 
 DELETE_REQUEST = range(1)
@@ -21,43 +32,86 @@ birthdays_schema = BirthdaysSchema()
 
 async def delete_birthday(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Get all birthdays and ask which one to delete."""
-    logging.info(f"User {update.effective_user.id} is deleting a birthday")
+    logging.info("User %s is deleting a birthday", update.effective_user.id)
 
     context.user_data.clear()
 
     try:
-        response = get_request(update.effective_user.id)
-        if response.status_code != 404:
-            response.raise_for_status()
-            data = response.json()
+        name_index = await get_name_index(update.effective_user.id)
         logging.info(
-            f"Retrieved {len(data)} birthdays for user {update.effective_user.id}"
+            "Retrieved %s birthdays for user %s",
+            len(name_index),
+            update.effective_user.id,
         )
     except Exception as e:
         logging.error(
-            f"Failed to retrieve birthdays for user {update.effective_user.id}: {e}"
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
         )
         # TODO: notify admin
         await update.message.reply_text(f"Failed. Please try again")
         return ConversationHandler.END
 
-    if response.status_code == 404:
-        logging.warning(f"No birthdays found for user {update.effective_user.id}")
+    if not name_index:
+        logging.warning("No birthdays found for user %s", update.effective_user.id)
         await update.message.reply_text("No birthdays found. /add_birthday to add one")
         return ConversationHandler.END
 
-    data = sorted(data, key=lambda x: x["name"])
-    logging.debug(f"Birthday data sorted by name for user {update.effective_user.id}")
+    reply_markup = birthdays_keyboard(name_index)
+
+    await update.message.reply_text(
+        f"Choose whose birthday to delete{SEARCH_HINT}", reply_markup=reply_markup
+    )
+    return DELETE_REQUEST
+
+
+async def delete_search(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Narrow the keyboard to birthdays whose name starts with the entered text."""
+    search = update.message.text
+    logging.info("User %s searched for: %s", update.effective_user.id, search)
 
-    keyboard = []
-    for birthday in data:
-        keyboard.append(
-            [InlineKeyboardButton(birthday["name"], callback_data=birthday["id"])]
+    try:
+        name_index = await get_name_index(update.effective_user.id)
+    except Exception as e:
+        logging.error(
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
         )
-    reply_markup = InlineKeyboardMarkup(keyboard)
+        await update.message.reply_text("Failed. Please try again")
+        return ConversationHandler.END
 
-    await update.message.reply_text(
-        "Choose whose birthday to delete:", reply_markup=reply_markup
+    found = name_index.search(search)
+    if not found:
+        await update.message.reply_text(
+            "No one found. Type another name or its first letters:"
+        )
+        return DELETE_REQUEST
+
+    message = await update.message.reply_text(
+        "Choose whose birthday to delete:", reply_markup=birthdays_keyboard(found)
+    )
+    remember_search(context, message, search)
+    return DELETE_REQUEST
+
+
+async def delete_page(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show another page of the keyboard to choose a birthday."""
+    query = update.callback_query
+    await query.answer()
+
+    try:
+        name_index = await get_name_index(update.effective_user.id)
+    except Exception as e:
+        logging.error(
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
+        )
+        await query.edit_message_text("Failed. Please try again")
+        return ConversationHandler.END
+
+    await edit_keyboard(
+        query,
+        birthdays_keyboard(
+            name_index.search(search_of(context, query.message)),
+            page_from_query(query),
+        ),
     )
     return DELETE_REQUEST
 
@@ -70,14 +124,19 @@ async def delete_handle_response(update: Update, context: ContextTypes.DEFAULT_T
     birthday_id = query.data
 
     try:
-        response = delete_request(update.effective_user.id, birthday_id)
+        response = await delete_request(update.effective_user.id, birthday_id)
         response.raise_for_status()
         logging.info(
-            f"Successfully deleted birthday with id {birthday_id} for user {update.effective_user.id}"
+            "Successfully deleted birthday with id %s for user %s",
+            birthday_id,
+            update.effective_user.id,
         )
     except Exception as e:
         logging.error(
-            f"Failed to delete birthday with id {birthday_id} for user {update.effective_user.id}: {e}"
+            "Failed to delete birthday with id %s for user %s: %s",
+            birthday_id,
+            update.effective_user.id,
+            e,
         )
         await query.edit_message_text("Failed. Please try again}")
         return ConversationHandler.END
@@ -90,7 +149,13 @@ async def delete_handle_response(update: Update, context: ContextTypes.DEFAULT_T
 
 delete_conv_handler = ConversationHandler(
     entry_points=[CommandHandler("delete", delete_birthday)],
-    states={DELETE_REQUEST: [CallbackQueryHandler(delete_handle_response)]},
+    states={
+        DELETE_REQUEST: [
+            CallbackQueryHandler(delete_handle_response, r"^[1-9]\d*$"),
+            CallbackQueryHandler(delete_page, PAGE_PATTERN),
+            MessageHandler(filters.TEXT & ~filters.COMMAND, delete_search),
+        ]
+    },
     fallbacks=[CommandHandler("stop", stop)],
     allow_reentry=True,
 )
@@ -11,5 +11,5 @@ async def stop(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     Use as a fallback function in handlers
     """
-    logging.info(f"User {update.effective_user.id} stopped the conversation")
+    logging.info("User %s stopped the conversation", update.effective_user.id)
     return ConversationHandler.END
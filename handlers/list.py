@@ -7,74 +7,102 @@ from telegram.ext import (
     ContextTypes,
 )
 
-from core.api_requests import get_request
+from core.api_requests import get_date_index
+from core.messages import chunk_lines
 
 
 async def list_birthdays(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Send a list of birthdays to the user"""
+    """Send a list of birthdays to the user
+
+    With a number argument (`/list 5`) send only that many upcoming birthdays.
+    Long lists are sent in several messages, each within Telegram's length limit.
+    """
     context.user_data.clear()
-    logging.info(f"Sending a list of birthdays to user {update.effective_user.id}")
+    logging.info("Sending a list of birthdays to user %s", update.effective_user.id)
 
     try:
-        response = get_request(update.effective_user.id)
-        if response.status_code != 404:
-            response.raise_for_status()
-            data = response.json()
-        else:
+        date_index = await get_date_index(update.effective_user.id)
+        if not date_index:
             await update.message.reply_text(
                 "No birthdays found. /add_birthday to add one"
             )
             return
     except Exception as e:
         logging.error(
-            f"Failed to retrieve birthdays for user {update.effective_user.id}: {e}"
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
         )
         await update.message.reply_text("Failed. Please try again")
         return
 
-    data = sorted(data, key=lambda x: (x["month"], x["day"]))
-
-    list_of_birthdays = "_Your list:_\n"
     today = datetime.now()
+    if context.args and context.args[0].isdigit():
+        lines = render_upcoming(date_index.upcoming(int(context.args[0]), today))
+    else:
+        lines = render_list(date_index, today)
+
+    for text in chunk_lines(lines):
+        await update.message.reply_text(text, parse_mode="Markdown")
+
+    logging.info("Sent list of birthdays to user %s", update.effective_user.id)
+
+
+def render_birthday(birthday) -> str:
+    """Return the date, name and note of the birthday for the list"""
+    day = birthday["day"]
+    month = month_name[birthday["month"]]
+    year = birthday["year"]
+    date = f"{day} {month}, {year}" if year is not None else f"{day} {month}"
+
+    note = f' ({birthday["note"]})' if birthday["note"] is not None else ""
+
+    return f"{date} --- *{birthday['name']}*{note}"
+
+
+def render_list(date_index, today):
+    """Yield lines of the list of birthdays with a panel for today
+
+    Args:
+        date_index (DateIndex): Birthdays of the user
+        today (datetime): Current date
+    """
     today_str = f"{today.day} {month_name[today.month]}"
     border = "============================\n"
 
-    inserted_today_panel = False
-
-    for birthday in data:
-        day = birthday["day"]
-        month = month_name[birthday["month"]]
-        year = birthday["year"]
-        date = f"{day} {month}, {year}" if year is not None else f"{day} {month}"
+    yield "_Your list:_\n"
 
-        note = f' ({birthday["note"]})' if birthday["note"] is not None else ""
+    today_position = date_index.position(today.month, today.day)
+    inserted_today_panel = False
 
+    for position, birthday in enumerate(date_index):
         # If it's today, special formatting:
         if birthday["day"] == today.day and birthday["month"] == today.month:
-            list_of_birthdays += (
-                f"{border} _Today:_ {date} --- *{birthday['name']}*{note}\n{border}"
-            )
+            yield border
+            yield f" _Today:_ {render_birthday(birthday)}\n"
+            yield border
             inserted_today_panel = True
-        
-        # Add the birthday to the list
-        else:
-            # Before appending any future or later birthdays, inject today-panel once
-            if not inserted_today_panel and (
-                birthday["month"] > today.month
-                or (birthday["month"] == today.month and birthday["day"] >= today.day)
-            ):
-                list_of_birthdays += f"{border}• {today_str} --- today\n{border}"
-                inserted_today_panel = True
-
-            # Now append this birthday
-            list_of_birthdays += f"• {date} --- *{birthday['name']}*{note}\n"
+            continue
+
+        # Before appending any later birthdays, inject today-panel once
+        if position >= today_position and not inserted_today_panel:
+            yield border
+            yield f"• {today_str} --- today\n"
+            yield border
+            inserted_today_panel = True
+
+        yield f"• {render_birthday(birthday)}\n"
 
     # If today's panel was not inserted, add it at the end
     if not inserted_today_panel:
-        list_of_birthdays += f"{border}• {today_str} --- today\n{border}"
+        yield border
+        yield f"• {today_str} --- today\n"
+        yield border
+
 
-    logging.info(f"Sent list of birthdays to user {update.effective_user.id}")
-    await update.message.reply_text(list_of_birthdays, parse_mode="Markdown")
+def render_upcoming(birthdays):
+    """Yield lines of the list of upcoming birthdays"""
+    yield "_Upcoming birthdays:_\n"
+    for birthday in birthdays:
+        yield f"• {render_birthday(birthday)}\n"
 
 
 # TODO: add this simple markdown everywhere (not v2, you'll have to put / everywhere)`)
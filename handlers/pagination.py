@@ -0,0 +1,70 @@
+from telegram import InlineKeyboardButton, InlineKeyboardMarkup
+from telegram.error import BadRequest
+
+PAGE_SIZE = 10
+PAGE_PATTERN = r"^page \d+$"
+SEARCH_HINT = " (or type the first letters of the name to search):"
+
+
+def birthdays_keyboard(name_index, page=0) -> InlineKeyboardMarkup:
+    """Build a keyboard with one page of birthdays from the `name_index`.
+
+    `name_index` can be a `NameIndex` or a `NameSearch` result.
+
+    Every birthday button has the birthday's id as callback data. Navigation
+    buttons have `page <number>` as callback data, see `PAGE_PATTERN`.
+    """
+    pages = max((len(name_index) - 1) // PAGE_SIZE + 1, 1)
+    page = min(max(page, 0), pages - 1)
+
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=id)]
+        for name, id in name_index.page(page, PAGE_SIZE)
+    ]
+
+    navigation = []
+    if page > 0:
+        navigation.append(
+            InlineKeyboardButton("« Previous", callback_data=f"page {page - 1}")
+        )
+    if page < pages - 1:
+        navigation.append(
+            InlineKeyboardButton("Next »", callback_data=f"page {page + 1}")
+        )
+    if navigation:
+        keyboard.append(navigation)
+
+    return InlineKeyboardMarkup(keyboard)
+
+
+def page_from_query(query) -> int:
+    """Return the page number from a navigation button's callback query"""
+    return int(query.data.split()[1])
+
+
+def remember_search(context, message, search):
+    """Remember the search the keyboard of the message was narrowed by
+
+    Searches are kept per message, so paging an older keyboard of the conversation
+    doesn't apply a later search to it. `user_data` is cleared when a conversation
+    starts, together with the searches.
+    """
+    context.user_data.setdefault("searches", {})[message.message_id] = search
+
+
+def search_of(context, message) -> str:
+    """Return the search the keyboard of the message was narrowed by, or `""`"""
+    return context.user_data.get("searches", {}).get(message.message_id, "")
+
+
+async def edit_keyboard(query, reply_markup):
+    """Replace the keyboard of the query's message, if it is different
+
+    Telegram rejects edits that don't change the message, e.g. when the page was
+    clamped to the same one because birthdays were deleted in the meantime.
+    """
+    try:
+        await query.edit_message_reply_markup(reply_markup)
+    except BadRequest as e:
+        if "not modified" not in e.message:
+            raise
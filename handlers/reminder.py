@@ -1,78 +1,447 @@
+from functools import partial
+import asyncio
 import datetime
 import logging
 
-from telegram.ext import ContextTypes
-from telegram.error import Forbidden
+import pytz
+from telegram.ext import ContextTypes, JobQueue
 
-from core.api_requests import incoming_birthdays_request
+from core.api_requests import incoming_birthdays_stream
+from core.config import (
+    REMINDER_CONCURRENCY,
+    REMINDER_GLOBAL_RATE,
+    REMINDER_CHAT_RATE,
+    REMINDER_DIGEST,
+)
+from core.blocked_chats import blocked_chats
+from core.dispatcher import MessageDispatcher, TokenBucket
+from core.journal import DeliveryJournal
+from core.messages import MESSAGE_MAX_LENGTH
+from core.storage import UserSettings, ReminderRun
+
+DEFAULT_TIMEZONE = "Europe/Kyiv"
+DEFAULT_HOUR = 10
+DEFAULT_BUCKET = (DEFAULT_TIMEZONE, DEFAULT_HOUR)
+
+# Limit of messages per second of all reminder jobs together, buckets with the same
+# time run at once (e.g. after a restart) and must not exceed Telegram's global limit
+global_bucket = TokenBucket(REMINDER_GLOBAL_RATE)
+
+# Time zone of the api's date, incoming birthdays are selected by it
+API_TIMEZONE = "Europe/Kyiv"
+
+
+class ReminderBuckets:
+    """Index of users by the time they receive reminders at
+
+    A bucket is a `(timezone, hour)` pair. Users without settings are in
+    `DEFAULT_BUCKET`, they are not stored in the index.
+
+    Attributes:
+        buckets (dict): Sets of telegram ids with buckets as keys
+        user_buckets (dict): Buckets with telegram ids as keys
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.user_buckets = {}
+
+    def load(self):
+        """Fill the index from the stored user settings"""
+        self.buckets.clear()
+        self.user_buckets.clear()
+        for settings in UserSettings.select():
+            self.add(settings.telegram_id, (settings.timezone, settings.hour))
+
+    def add(self, telegram_id, bucket):
+        """Move the user to the bucket"""
+        old_bucket = self.user_buckets.pop(telegram_id, None)
+        if old_bucket is not None:
+            self.buckets[old_bucket].discard(telegram_id)
+            if not self.buckets[old_bucket]:
+                del self.buckets[old_bucket]
+
+        if bucket != DEFAULT_BUCKET:
+            self.user_buckets[telegram_id] = bucket
+            self.buckets.setdefault(bucket, set()).add(telegram_id)
+
+    def get(self, telegram_id):
+        """Return the bucket of the user"""
+        return self.user_buckets.get(telegram_id, DEFAULT_BUCKET)
+
+    def is_empty(self, bucket) -> bool:
+        """Check if no user is in the bucket. Default bucket is never empty"""
+        return bucket != DEFAULT_BUCKET and not self.buckets.get(bucket)
+
+
+reminder_buckets = ReminderBuckets()
+
+
+class IncomingBirthdays:
+    """Incoming birthdays received from the api on its last two days
+
+    The api selects birthdays that are today, tomorrow or in a week on its own date,
+    see `api_today()`. Buckets whose date is the api's date get the current list,
+    it's received once a day and streamed to the first bucket that needs it.
+    Buckets behind the api's time zone run when it's already the next day there,
+    they get the list of the previous day.
+
+    Lists are kept whole, users are matched to buckets when the list is read.
+
+    Attributes:
+        lists (dict): Received birthdays with the api's dates as keys
+        lock (asyncio.Lock): Lock held while a list is received
+    """
+
+    def __init__(self):
+        self.lists = {}
+        self.lock = asyncio.Lock()
+
+    def get(self, date) -> list:
+        """Return birthdays received on the api's date, None if they weren't"""
+        return self.lists.get(date)
+
+    async def stream(self):
+        """Yield birthdays of the api's today, receive them if they weren't yet
+
+        The list is kept once it is received completely.
+        """
+        date = api_today()
+        async with self.lock:
+            birthdays = self.lists.get(date)
+            if birthdays is None:
+                birthdays = []
+                async for birthday in incoming_birthdays_stream():
+                    birthdays.append(birthday)
+                    yield birthday
+
+                previous_date = date - datetime.timedelta(days=1)
+                self.lists = {
+                    list_date: kept
+                    for list_date, kept in self.lists.items()
+                    if list_date == previous_date
+                }
+                self.lists[date] = birthdays
+                return
+
+        for birthday in birthdays:
+            yield birthday
+
+
+incoming_birthdays = IncomingBirthdays()
+
+
+def api_today() -> datetime.date:
+    """Return the api's date"""
+    return datetime.datetime.now(pytz.timezone(API_TIMEZONE)).date()
+
+
+def days_ahead_of_api(bucket, date) -> int:
+    """Return how many days the bucket's date is ahead of the api's when it runs
+
+    Args:
+        bucket: `(timezone, hour)` bucket
+        date (datetime.date): Date of the run in the bucket's time zone
+
+    Returns:
+        int: 1 if it's still the previous day for the api, -1 if it's the next day
+    """
+    timezone, hour = bucket
+    run_at = pytz.timezone(timezone).localize(
+        datetime.datetime.combine(date, datetime.time(hour))
+    )
+    api_date = run_at.astimezone(pytz.timezone(API_TIMEZONE)).date()
+    return (date - api_date).days
+
+
+def is_servable(bucket) -> bool:
+    """Check if reminders can be sent to the bucket all year round
+
+    Birthdays of a day are known only once it's that day for the api, so the
+    bucket's date can't be ahead of the api's in winter or in summer time.
+    """
+    year = datetime.date.today().year
+    return all(
+        days_ahead_of_api(bucket, datetime.date(year, month, 1)) <= 0
+        for month in (1, 7)
+    )
+
+
+def bucket_name(bucket) -> str:
+    """Return the bucket as `timezone hour` string"""
+    timezone, hour = bucket
+    return f"{timezone} {hour}"
+
+
+def schedule_reminders(job_queue: JobQueue):
+    """Load user settings and schedule a daily reminder job for every bucket
+
+    Buckets whose time has passed today without a finished run (e.g. the bot was
+    restarted during or before the run) are run once right away.
+    """
+    reminder_buckets.load()
+    blocked_chats.load()
+    for bucket in [DEFAULT_BUCKET, *reminder_buckets.buckets]:
+        schedule_bucket(job_queue, bucket)
+        schedule_catch_up(job_queue, bucket)
+
+
+def schedule_bucket(job_queue: JobQueue, bucket):
+    """Schedule a daily reminder job for the bucket if it is not scheduled yet"""
+    timezone, hour = bucket
+    name = f"reminder {bucket_name(bucket)}"
+    if job_queue.get_jobs_by_name(name):
+        return
+
+    logging.info("Scheduling reminders at %s:00 %s", hour, timezone)
+    job_queue.run_daily(
+        callback=reminder,
+        time=datetime.time(hour=hour, tzinfo=pytz.timezone(timezone)),
+        data=bucket,
+        name=name,
+    )
+
+
+def schedule_catch_up(job_queue: JobQueue, bucket):
+    """Run the bucket's reminders now if today's run is due but not finished"""
+    timezone, hour = bucket
+    now = datetime.datetime.now(pytz.timezone(timezone))
+    if now.hour < hour:
+        return
+
+    finished = ReminderRun.select().where(
+        (ReminderRun.date == now.date())
+        & (ReminderRun.bucket == bucket_name(bucket))
+        & ReminderRun.finished_at.is_null(False)
+    )
+    if finished.exists():
+        return
+
+    logging.info("Reminders for %s are not finished today, running them now", bucket)
+    job_queue.run_once(
+        callback=reminder,
+        when=0,
+        data=bucket,
+        name=f"reminder catch-up {bucket_name(bucket)}",
+    )
 
 
 async def reminder(context: ContextTypes.DEFAULT_TYPE):
     """Send reminders about incoming birthdays
 
     A callback function for the `job_queue`.
-    Request the API for incoming birthdays and send a message to the user if
-      they are today, tomorrow or in a week.
+    Stream incoming birthdays from the API and send a message to the user if
+      they are today, tomorrow or in a week on the bucket's date. Messages are sent
+      concurrently within Telegram's rate limits while the rest of the list is still
+      being received. All buckets share the list received once a day.
+
+    In digest mode all reminders of a user are sent in one message instead.
+
+    Job's data is the `(timezone, hour)` bucket, only users in it get reminders.
+    Job of a bucket that has no users left is removed.
+
+    Results are written to the delivery journal. Reminders already sent today are
+    skipped, so the job can be rerun after a crash without duplicates.
     """
-    logging.info("Sending reminders about incoming birthdays")
+    bucket = context.job.data if context.job and context.job.data else DEFAULT_BUCKET
+
+    if reminder_buckets.is_empty(bucket):
+        logging.info("No users receive reminders at %s, removing the job", bucket)
+        context.job.schedule_removal()
+        return
+
+    today = datetime.datetime.now(pytz.timezone(bucket[0])).date()
+    run, _ = ReminderRun.get_or_create(date=today, bucket=bucket_name(bucket))
+    if run.finished_at is not None:
+        logging.info("Reminders for %s were already sent today", bucket)
+        return
+
+    logging.info("Sending reminders about incoming birthdays for %s", bucket)
+
+    journal = DeliveryJournal(today)
+    journal.load()
+
+    dispatcher = MessageDispatcher(
+        context.bot,
+        concurrency=REMINDER_CONCURRENCY,
+        global_bucket=global_bucket,
+        chat_rate=REMINDER_CHAT_RATE,
+        on_result=partial(record_reminder_result, journal),
+    )
 
     try:
-        response = incoming_birthdays_request()
-        if response.status_code == 404:
-            return
-        response.raise_for_status()
+        await dispatcher.run(
+            digest_messages(bucket, today, journal)
+            if REMINDER_DIGEST
+            else reminder_messages(bucket, today, journal)
+        )
     except Exception as e:
-        logging.error(f"Failed to retrieve incoming birthdays: {e}")
+        logging.error("Failed to retrieve incoming birthdays: %s", e)
         # TODO: notify admin
         return
+    finally:
+        journal.flush()
 
-    data = response.json()
+    run.finished_at = datetime.datetime.now()
+    run.save()
 
-    for birthday in data:
-        name = birthday["name"]
-        note = birthday["note"]
-        year = birthday["year"]
 
-        if birthday["incoming_in_days"] == 0:
-            message = "*Today*"
-        elif birthday["incoming_in_days"] == 1:
-            message = "Tomorrow"
-        elif birthday["incoming_in_days"] == 7:
-            message = "Next week"
+async def bucket_birthdays(bucket, today, journal):
+    """Yield incoming birthdays of the users in the bucket not reminded about today
 
-        message += f" is *{name}*'s birthday"
+    Birthdays are taken from the list the api selected on the bucket's date `today`,
+      see `IncomingBirthdays`. Nothing is yielded if that list can't be received.
+    Users who blocked the bot are skipped.
+    """
+    if today == api_today():
+        birthdays = incoming_birthdays.stream()
+    else:
+        kept = incoming_birthdays.get(today)
+        if kept is None:
+            logging.warning(
+                "Incoming birthdays of %s were not received, can't remind %s",
+                today,
+                bucket,
+            )
+            return
+        birthdays = aiter_list(kept)
 
-        if year:
-            age = datetime.date.today().year - birthday["year"]
-            message += f" - turning {age}"
+    async for birthday in birthdays:
+        telegram_id = birthday["creator"]["telegram_id"]
+        if reminder_buckets.get(telegram_id) != bucket:
+            continue
+        if telegram_id in blocked_chats:
+            continue
+        if journal.is_delivered(birthday["id"], telegram_id):
+            continue
+        yield birthday
 
-        if birthday["incoming_in_days"] == 0:
-            message += "!"
-        else:
-            message += "."
 
-        if note:
-            message += f"\n(your note: {note})"
+async def aiter_list(items):
+    """Yield items of the list, to iterate it like a stream"""
+    for item in items:
+        yield item
 
-        if birthday["incoming_in_days"] == 0:
-            message += "\nSend them best wishes! :)"
 
-        try:
-            await context.bot.send_message(
-                chat_id=birthday["creator"]["telegram_id"],
-                text=message,
-                parse_mode="Markdown",
-            )
-            logging.info(
-                f"Sent message to user {birthday['creator']['telegram_id']}. Data: {birthday}"
-            )
-        except Forbidden as e:
-            logging.warning(
-                f"Failed to send message to user {birthday['creator']['telegram_id']}: {e}. "
-                "User might have blocked the bot or left the chat."
-            )
-        except Exception as e:
-            logging.error(
-                f"Failed to send message: {e}. User: {birthday['creator']['telegram_id']}, birthday id: {birthday['id']}"
-            )
-            # TODO: notify admin
+async def reminder_messages(bucket, today, journal):
+    """Yield `(chat_id, text, [birthday])` for every incoming birthday in the bucket"""
+    async for birthday in bucket_birthdays(bucket, today, journal):
+        yield (
+            birthday["creator"]["telegram_id"],
+            format_reminder(birthday, today),
+            [birthday],
+        )
+
+
+async def digest_messages(bucket, today, journal):
+    """Yield `(chat_id, text, birthdays)` with all reminders of every user in the bucket
+
+    Incoming birthdays are grouped by their creator, so the whole list has to be
+    received before the first message is yielded. Reminders are ordered by how soon
+    the birthday is. Digest longer than Telegram's message limit is split.
+    """
+    birthdays_by_user = {}
+    async for birthday in bucket_birthdays(bucket, today, journal):
+        birthdays_by_user.setdefault(birthday["creator"]["telegram_id"], []).append(
+            birthday
+        )
+
+    for telegram_id, birthdays in birthdays_by_user.items():
+        birthdays.sort(key=lambda x: x["incoming_in_days"])
+
+        parts = []
+        length = 0
+        for birthday in birthdays:
+            text = format_reminder(birthday, today)
+            if parts and length + len(text) + 2 > MESSAGE_MAX_LENGTH:
+                yield telegram_id, "\n\n".join(text for text, _ in parts), [
+                    birthday for _, birthday in parts
+                ]
+                parts = []
+                length = 0
+            parts.append((text, birthday))
+            length += len(text) + 2
+
+        yield telegram_id, "\n\n".join(text for text, _ in parts), [
+            birthday for _, birthday in parts
+        ]
+
+
+def format_reminder(birthday, today) -> str:
+    """Return reminder message text for the incoming birthday
+
+    Age is counted for the year of the birthday, `today` is the bucket's date.
+    """
+    name = birthday["name"]
+    note = birthday["note"]
+    year = birthday["year"]
+
+    if birthday["incoming_in_days"] == 0:
+        message = "*Today*"
+    elif birthday["incoming_in_days"] == 1:
+        message = "Tomorrow"
+    elif birthday["incoming_in_days"] == 7:
+        message = "Next week"
+
+    message += f" is *{name}*'s birthday"
+
+    if year:
+        birthday_date = today + datetime.timedelta(days=birthday["incoming_in_days"])
+        age = birthday_date.year - birthday["year"]
+        message += f" - turning {age}"
+
+    if birthday["incoming_in_days"] == 0:
+        message += "!"
+    else:
+        message += "."
+
+    if note:
+        message += f"\n(your note: {note})"
+
+    if birthday["incoming_in_days"] == 0:
+        message += "\nSend them best wishes! :)"
+
+    return message
+
+
+def record_reminder_result(journal, birthdays, status, error):
+    """Log the result of sending a reminder and write it to the journal
+
+    Users who blocked the bot are remembered and skipped in the next runs.
+    """
+    log_reminder_result(birthdays, status, error)
+    if status == "blocked":
+        blocked_chats.add(birthdays[0]["creator"]["telegram_id"])
+    for birthday in birthdays:
+        journal.record(birthday["id"], birthday["creator"]["telegram_id"], status)
+
+
+def log_reminder_result(birthdays, status, error):
+    """Log the result of sending a reminder about the birthdays"""
+    telegram_id = birthdays[0]["creator"]["telegram_id"]
+    birthday_ids = [birthday["id"] for birthday in birthdays]
+
+    if status == "sent":
+        logging.info(
+            "Sent message to user %s. Data: %s",
+            telegram_id,
+            birthdays,
+            extra={"category": "reminder", "user_id": telegram_id},
+        )
+    elif status == "blocked":
+        logging.warning(
+            "Failed to send message to user %s: %s. "
+            "User might have blocked the bot or left the chat.",
+            telegram_id,
+            error,
+            extra={"user_id": telegram_id},
+        )
+    else:
+        logging.error(
+            "Failed to send message: %s. User: %s, birthday ids: %s",
+            error,
+            telegram_id,
+            birthday_ids,
+            extra={"user_id": telegram_id},
+        )
+        # TODO: notify admin
@@ -0,0 +1,78 @@
+import logging
+
+import pytz
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from core.storage import UserSettings
+from handlers.reminder import (
+    is_servable,
+    reminder_buckets,
+    schedule_bucket,
+    API_TIMEZONE,
+    DEFAULT_BUCKET,
+)
+
+
+async def settings(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Show or change user's time zone and the hour reminders are sent at.
+
+    Usage: `/settings <time zone> <hour>`, e.g. `/settings Europe/Berlin 9`.
+    Without arguments show current settings.
+    """
+    user_id = update.effective_user.id
+    timezone, hour = reminder_buckets.get(user_id)
+
+    if not context.args:
+        await update.message.reply_text(
+            f"Reminders are sent at {hour}:00, time zone: {timezone}.\n"
+            "To change, send `/settings <time zone> <hour>`, e.g. `/settings Europe/Berlin 9`",
+            parse_mode="Markdown",
+        )
+        return
+
+    try:
+        timezone = str(pytz.timezone(context.args[0]))
+        hour = int(context.args[1]) if len(context.args) > 1 else hour
+        if not 0 <= hour <= 23:
+            raise ValueError
+    except pytz.UnknownTimeZoneError:
+        logging.warning(
+            "User %s entered unknown time zone: %s", user_id, context.args[0]
+        )
+        await update.message.reply_text(
+            "Unknown time zone. Use a name like `Europe/Kyiv` or `America/New_York`",
+            parse_mode="Markdown",
+        )
+        return
+    except ValueError:
+        logging.warning("User %s entered invalid hour: %s", user_id, context.args[1])
+        await update.message.reply_text("Hour has to be a number from 0 to 23")
+        return
+
+    bucket = (timezone, hour)
+    if not is_servable(bucket):
+        logging.warning(
+            "User %s entered unservable hour: %s %s", user_id, hour, timezone
+        )
+        await update.message.reply_text(
+            f"At {hour}:00 in {timezone} it's still the previous day in {API_TIMEZONE}, "
+            "where birthdays are counted, so reminders can't be sent then. "
+            "Choose a later hour"
+        )
+        return
+
+    if bucket == DEFAULT_BUCKET:
+        UserSettings.delete_by_id(user_id)
+    else:
+        UserSettings.replace(
+            telegram_id=user_id, timezone=timezone, hour=hour
+        ).execute()
+
+    reminder_buckets.add(user_id, bucket)
+    schedule_bucket(context.job_queue, bucket)
+
+    logging.info("User %s set reminders at %s:00 %s", user_id, hour, timezone)
+    await update.message.reply_text(
+        f"Done! Reminders will be sent at {hour}:00, time zone: {timezone}"
+    )
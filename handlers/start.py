@@ -4,9 +4,14 @@ from telegram.ext import (
 )
 import logging
 
+from core.blocked_chats import blocked_chats
+
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    logging.info(f"User {update.effective_user.id} started the bot")
+    logging.info("User %s started the bot", update.effective_user.id)
+
+    # User might have blocked the bot before, send reminders again
+    blocked_chats.discard(update.effective_user.id)
 
     await update.message.reply_text(
         "Welcome to BirthdayBot!\nYou can start by adding a birthday with /add command."
@@ -0,0 +1,84 @@
+from datetime import date
+import logging
+
+from telegram import Update
+from telegram.ext import (
+    ContextTypes,
+)
+
+from core.api_requests import get_date_index
+from core.index import birthday_date
+from core.messages import chunk_lines
+from handlers.list import render_birthday
+
+DEFAULT_DAYS = 30
+
+
+async def upcoming_birthdays(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Send birthdays of the next days to the user
+
+    Usage: `/upcoming [days]`, 30 days by default.
+    """
+    context.user_data.clear()
+
+    days = DEFAULT_DAYS
+    if context.args:
+        if not context.args[0].isdigit():
+            await update.message.reply_text(
+                "Send `/upcoming` or `/upcoming <number of days>`",
+                parse_mode="Markdown",
+            )
+            return
+        days = int(context.args[0])
+
+    logging.info(
+        "Sending birthdays of the next %s days to user %s",
+        days,
+        update.effective_user.id,
+    )
+
+    try:
+        date_index = await get_date_index(update.effective_user.id)
+    except Exception as e:
+        logging.error(
+            "Failed to retrieve birthdays for user %s: %s", update.effective_user.id, e
+        )
+        await update.message.reply_text("Failed. Please try again")
+        return
+
+    today = date.today()
+    birthdays = date_index.within(days, today)
+    if not birthdays:
+        await update.message.reply_text(f"No birthdays in the next {days} days")
+        return
+
+    for text in chunk_lines(render_upcoming_days(birthdays, days, today)):
+        await update.message.reply_text(text, parse_mode="Markdown")
+
+
+def render_upcoming_days(birthdays, days, today):
+    """Yield lines of the list of birthdays with days left until each"""
+    yield f"_Birthdays in the next {days} days:_\n"
+
+    for birthday in birthdays:
+        days_left = days_until(birthday, today)
+        if days_left == 0:
+            when = "today"
+        elif days_left == 1:
+            when = "tomorrow"
+        else:
+            when = f"in {days_left} days"
+        yield f"• {render_birthday(birthday)} ({when})\n"
+
+
+def days_until(birthday, today) -> int:
+    """Return number of days until the next birthday, 0 if it's today
+
+    Birthdays on Feb 29 are on Mar 1 in non-leap years.
+    """
+    next_birthday = birthday_date(birthday["month"], birthday["day"], today.year)
+    if next_birthday < today:
+        next_birthday = birthday_date(
+            birthday["month"], birthday["day"], today.year + 1
+        )
+    return (next_birthday - today).days
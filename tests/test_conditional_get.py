@@ -0,0 +1,112 @@
+from unittest import mock
+import unittest
+
+import httpx
+
+try:
+    from core import api_requests
+    from core.cache import ResponseCache
+except FileNotFoundError:
+    # core.config reads config.ini on import
+    raise unittest.SkipTest("config.ini is required")
+
+from tools.fake_api import start_fake_api
+
+
+class ResponseCacheTest(unittest.TestCase):
+    def test_evicts_least_recently_used_over_max_bytes(self):
+        cache = ResponseCache(max_bytes=10)
+        cache.set("a", {"ETag": '"a"'}, b"aaaa")
+        cache.set("b", {"ETag": '"b"'}, b"bbbb")
+        cache.get("a")
+        cache.set("c", {"ETag": '"c"'}, b"cccc")
+
+        self.assertIsNone(cache.get("b"))
+        self.assertEqual(cache.get("a"), ({"ETag": '"a"'}, b"aaaa"))
+        self.assertEqual(cache.size, 8)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_keeps_only_validators_and_content_type(self):
+        cache = ResponseCache()
+        cache.set(
+            "a",
+            {"ETag": '"a"', "Content-Type": "application/json", "Set-Cookie": "x"},
+            b"[]",
+        )
+
+        self.assertEqual(
+            cache.get("a"), ({"ETag": '"a"', "Content-Type": "application/json"}, b"[]")
+        )
+
+    def test_does_not_keep_body_larger_than_max_bytes(self):
+        cache = ResponseCache(max_bytes=3)
+        cache.set("a", {"ETag": '"a"'}, b"aaaa")
+
+        self.assertIsNone(cache.get("a"))
+        self.assertEqual(cache.size, 0)
+
+
+class ConditionalGetTest(unittest.IsolatedAsyncioTestCase):
+    """`CustomSession.conditional_get()` against `tools.fake_api`"""
+
+    async def asyncSetUp(self):
+        self.server = start_fake_api(users=1, birthdays=5)
+        self.addCleanup(self.server.shutdown)
+        self.url = f"http://127.0.0.1:{self.server.server_port}"
+
+        self.transport = httpx.AsyncHTTPTransport()
+        self.cache = ResponseCache()
+        for name, value in [
+            ("API_URL", self.url),
+            ("transport", self.transport),
+            ("response_cache", self.cache),
+        ]:
+            patcher = mock.patch.object(api_requests, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        self.session = api_requests.CustomSession(1)
+        await self.session.login("encrypted bot id")
+
+        self.statuses = []
+
+        async def record_status(response):
+            self.statuses.append(response.status_code)
+
+        self.session.event_hooks["response"].append(record_status)
+
+    async def asyncTearDown(self):
+        await self.transport.aclose()
+
+    async def test_not_modified_response_has_kept_body(self):
+        first = await self.session.conditional_get(f"{self.url}/birthdays")
+        second = await self.session.conditional_get(f"{self.url}/birthdays")
+
+        self.assertEqual(self.statuses, [200, 304])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second.json(), first.json())
+        self.assertEqual(len(self.cache.entries), 1)
+        self.assertEqual(self.cache.size, len(first.content))
+
+    async def test_modified_response_replaces_kept_body(self):
+        await self.session.conditional_get(f"{self.url}/birthdays")
+        for birthday in self.server.api.birthdays[1].values():
+            birthday["note"] = "Changed"
+        response = await self.session.conditional_get(f"{self.url}/birthdays")
+
+        self.assertEqual(self.statuses, [200, 200])
+        self.assertTrue(all(b["note"] == "Changed" for b in response.json()))
+        self.assertEqual(self.cache.size, len(response.content))
+
+    async def test_body_over_max_bytes_is_downloaded_again(self):
+        self.cache.max_bytes = 10
+        await self.session.conditional_get(f"{self.url}/birthdays")
+        response = await self.session.conditional_get(f"{self.url}/birthdays")
+
+        self.assertEqual(self.statuses, [200, 200])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.cache.size, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
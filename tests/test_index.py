@@ -0,0 +1,68 @@
+from datetime import date
+import unittest
+
+from core.index import DateIndex, birthday_date
+
+
+def birthdays_on(*days) -> list:
+    return [
+        {"id": number, "name": f"Person {number}", "month": month, "day": day}
+        for number, (month, day) in enumerate(days)
+    ]
+
+
+def days_of(birthdays) -> list:
+    return [(birthday["month"], birthday["day"]) for birthday in birthdays]
+
+
+class BirthdayDateTest(unittest.TestCase):
+    def test_feb_29_is_on_mar_1_in_non_leap_years(self):
+        self.assertEqual(birthday_date(2, 29, 2026), date(2026, 3, 1))
+        self.assertEqual(birthday_date(2, 29, 2028), date(2028, 2, 29))
+
+    def test_other_days_are_unchanged(self):
+        self.assertEqual(birthday_date(12, 31, 2026), date(2026, 12, 31))
+
+
+class DateIndexWithinTest(unittest.TestCase):
+    def setUp(self):
+        self.index = DateIndex(
+            birthdays_on((1, 2), (2, 28), (2, 29), (3, 1), (10, 17), (12, 31))
+        )
+
+    def test_includes_today_and_the_last_day(self):
+        self.assertEqual(
+            days_of(self.index.within(75, date(2026, 10, 17))), [(10, 17), (12, 31)]
+        )
+        self.assertEqual(days_of(self.index.within(74, date(2026, 10, 17))), [(10, 17)])
+
+    def test_wraps_to_january_at_the_end_of_the_year(self):
+        self.assertEqual(
+            days_of(self.index.within(3, date(2026, 12, 30))), [(12, 31), (1, 2)]
+        )
+
+    def test_whole_year_starts_from_today(self):
+        self.assertEqual(
+            days_of(self.index.within(365, date(2026, 10, 17))),
+            [(10, 17), (12, 31), (1, 2), (2, 28), (2, 29), (3, 1)],
+        )
+
+    def test_feb_29_is_on_mar_1_in_non_leap_years(self):
+        self.assertEqual(
+            days_of(self.index.within(0, date(2026, 3, 1))), [(2, 29), (3, 1)]
+        )
+        self.assertEqual(days_of(self.index.within(0, date(2026, 2, 28))), [(2, 28)])
+
+    def test_feb_29_is_on_its_own_day_in_leap_years(self):
+        self.assertEqual(days_of(self.index.within(0, date(2028, 2, 29))), [(2, 29)])
+        self.assertEqual(days_of(self.index.within(0, date(2028, 3, 1))), [(3, 1)])
+
+    def test_window_crossing_feb_29_into_a_leap_year(self):
+        self.assertEqual(
+            days_of(self.index.within(90, date(2027, 12, 1))),
+            [(12, 31), (1, 2), (2, 28), (2, 29)],
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
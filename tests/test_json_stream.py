@@ -0,0 +1,78 @@
+import json
+import random
+import unittest
+
+from core.json_stream import iter_json_array
+
+
+async def chunks_of(parts):
+    for part in parts:
+        yield part
+
+
+async def parse(parts) -> list:
+    return [item async for item in iter_json_array(chunks_of(parts))]
+
+
+def split_randomly(text, rng) -> list:
+    """Split text at random positions into at least one part"""
+    cuts = sorted(rng.sample(range(1, len(text)), rng.randint(0, len(text) - 1)))
+    return [text[i:j] for i, j in zip([0, *cuts], [*cuts, len(text)])]
+
+
+class IterJsonArrayTest(unittest.IsolatedAsyncioTestCase):
+    async def test_items_split_between_chunks(self):
+        self.assertEqual(
+            await parse(['[{"name": "An', 'n", "day": 1}', ', {"name": "Bob"}]']),
+            [{"name": "Ann", "day": 1}, {"name": "Bob"}],
+        )
+
+    async def test_number_split_after_dot(self):
+        self.assertEqual(await parse(["[", "-7, 23.", "5]"]), [-7, 23.5])
+
+    async def test_number_split_after_exponent(self):
+        self.assertEqual(await parse(["[1e", "3, 2E", "-1]"]), [1e3, 2e-1])
+
+    async def test_number_split_before_digit(self):
+        self.assertEqual(await parse(["[12", "34", "]"]), [1234])
+
+    async def test_empty_array(self):
+        self.assertEqual(await parse([" [ ", " ] "]), [])
+
+    async def test_random_chunk_boundaries(self):
+        rng = random.Random(0)
+        data = [
+            -7,
+            23.5,
+            0,
+            -0.25e-3,
+            1e10,
+            True,
+            False,
+            None,
+            "text with , and ] inside",
+            {"name": "Ann", "note": None, "year": 1999, "ids": [1, 2.5, -3]},
+            [],
+            {},
+        ]
+        for _ in range(500):
+            items = rng.sample(data, rng.randint(0, len(data)))
+            text = json.dumps(items, indent=rng.choice([None, 1]))
+            with self.subTest(text=text):
+                self.assertEqual(await parse(split_randomly(text, rng)), items)
+
+    async def test_not_an_array(self):
+        with self.assertRaises(ValueError):
+            await parse(['{"name": "Ann"}'])
+
+    async def test_incomplete_array(self):
+        with self.assertRaises(ValueError):
+            await parse(["[1, 2"])
+
+    async def test_data_after_array(self):
+        with self.assertRaises(ValueError):
+            await parse(["[1]", " 2"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,32 @@
+from datetime import date
+import unittest
+
+try:
+    from handlers.upcoming import days_until
+except FileNotFoundError:
+    # core.config reads config.ini on import
+    raise unittest.SkipTest("config.ini is required")
+
+
+class DaysUntilTest(unittest.TestCase):
+    def test_today(self):
+        self.assertEqual(days_until({"month": 10, "day": 17}, date(2026, 10, 17)), 0)
+
+    def test_later_this_year(self):
+        self.assertEqual(days_until({"month": 12, "day": 31}, date(2026, 10, 17)), 75)
+
+    def test_wraps_to_next_year(self):
+        self.assertEqual(days_until({"month": 1, "day": 2}, date(2026, 12, 30)), 3)
+        self.assertEqual(days_until({"month": 10, "day": 16}, date(2026, 10, 17)), 364)
+
+    def test_feb_29_in_a_non_leap_year(self):
+        self.assertEqual(days_until({"month": 2, "day": 29}, date(2026, 10, 17)), 135)
+        self.assertEqual(days_until({"month": 2, "day": 29}, date(2027, 3, 1)), 0)
+
+    def test_feb_29_before_a_leap_year(self):
+        self.assertEqual(days_until({"month": 2, "day": 29}, date(2027, 3, 2)), 364)
+        self.assertEqual(days_until({"month": 2, "day": 29}, date(2028, 2, 28)), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+from types import SimpleNamespace
+import asyncio
+import unittest
+
+from telegram import Update
+
+from core.update_processor import PerUserUpdateProcessor
+
+
+class UserUpdate(Update):
+    """Update with only `effective_user` set"""
+
+    def __init__(self, user_id):
+        super().__init__(update_id=0)
+        self._user_id = user_id
+
+    @property
+    def effective_user(self):
+        return SimpleNamespace(id=self._user_id)
+
+
+class PerUserUpdateProcessorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_updates_of_one_user_are_processed_in_order(self):
+        processor = PerUserUpdateProcessor(4)
+        events = []
+
+        async def handle(number):
+            events.append(("start", number))
+            await asyncio.sleep(0.01)
+            events.append(("end", number))
+
+        await asyncio.gather(
+            *(processor.process_update(UserUpdate(1), handle(n)) for n in range(3))
+        )
+
+        self.assertEqual(
+            events,
+            [
+                ("start", 0),
+                ("end", 0),
+                ("start", 1),
+                ("end", 1),
+                ("start", 2),
+                ("end", 2),
+            ],
+        )
+        self.assertEqual(processor.locks, {})
+
+    async def test_waiting_updates_of_one_user_dont_block_other_users(self):
+        processor = PerUserUpdateProcessor(2)
+        release = asyncio.Event()
+
+        busy = [
+            asyncio.create_task(processor.process_update(UserUpdate(1), release.wait()))
+            for _ in range(5)
+        ]
+        await asyncio.sleep(0)
+
+        other = asyncio.Event()
+
+        async def handle_other():
+            other.set()
+
+        await asyncio.wait_for(
+            processor.process_update(UserUpdate(2), handle_other()), timeout=1
+        )
+        self.assertTrue(other.is_set())
+
+        release.set()
+        await asyncio.gather(*busy)
+
+    async def test_limits_updates_processed_at_once(self):
+        processor = PerUserUpdateProcessor(2)
+        running = 0
+        most_running = 0
+
+        async def handle():
+            nonlocal running, most_running
+            running += 1
+            most_running = max(most_running, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+
+        await asyncio.gather(
+            *(processor.process_update(UserUpdate(n), handle()) for n in range(6))
+        )
+
+        self.assertEqual(most_running, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,351 @@
+"""End-to-end benchmark of the bot's handlers and reminder fan-out.
+
+Runs the real handlers through a `telegram.ext.Application` whose bot talks to a fake
+Telegram instead of the Bot API, against the fake birthday-api from `tools.fake_api`.
+Every simulated user goes through `/list`, `/add`, `/change`, `/delete` and `/list`
+again, then the `reminder` job sends reminders about incoming birthdays of all users:
+
+    python -m tools.benchmark --users 500 --birthdays 50 --concurrency 50
+
+Results are printed as JSON (or written to `--output`) so runs can be compared:
+latency percentiles of all updates and of every handler, updates per second,
+reminder duration and peak RSS of the process (the fake api runs in it too).
+Updates are processed with the `[Updates]` concurrency and reminders are sent within
+the `[Reminder]` rate limits of `config.ini`. Logs are only written with `--logging`,
+which sets logging up the same way as the bot.
+"""
+
+from types import SimpleNamespace
+from time import perf_counter
+from warnings import filterwarnings
+import argparse
+import asyncio
+import importlib
+import itertools
+import json
+import os
+import resource
+import sys
+import tempfile
+
+from telegram import Update
+from telegram.ext import ApplicationBuilder, CommandHandler
+from telegram.request import BaseRequest
+from telegram.warnings import PTBUserWarning
+
+filterwarnings(
+    action="ignore", message=r".*CallbackQueryHandler", category=PTBUserWarning
+)
+
+from core import api_requests
+from core.api_requests import session_manager
+from core.blocked_chats import blocked_chats
+from core.config import CONCURRENT_UPDATES
+from core.instrumentation import instrument_handlers
+from core.storage import db, init_db
+from core.update_processor import PerUserUpdateProcessor
+from handlers.add import add_conv_handler
+from handlers.change import change_conv_handler
+from handlers.delete import delete_conv_handler
+from handlers.list import list_birthdays
+from handlers.reminder import DEFAULT_BUCKET, reminder, reminder_buckets
+from tools.fake_api import start_fake_api
+
+BOT_USER = {
+    "id": 1,
+    "is_bot": True,
+    "first_name": "BirthdayBot",
+    "username": "birthday_benchmark_bot",
+    "can_join_groups": False,
+    "can_read_all_group_messages": False,
+    "supports_inline_queries": False,
+}
+
+
+class FakeTelegram(BaseRequest):
+    """Request backend of the bot that answers Bot API calls locally
+
+    Args:
+        latency (float): Seconds every call is delayed by
+
+    Attributes:
+        calls (dict): Number of calls by Bot API method
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = {}
+        self.message_ids = itertools.count(1)
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, **kwargs):
+        endpoint = url.rsplit("/", 1)[1]
+        self.calls[endpoint] = self.calls.get(endpoint, 0) + 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        parameters = request_data.parameters if request_data else {}
+        if endpoint == "getMe":
+            result = BOT_USER
+        elif endpoint in ("sendMessage", "editMessageText"):
+            result = {
+                "message_id": next(self.message_ids),
+                "date": 0,
+                "chat": {"id": parameters.get("chat_id", 1), "type": "private"},
+                "text": parameters.get("text", ""),
+            }
+        else:
+            result = True
+        return 200, json.dumps({"ok": True, "result": result}).encode("utf-8")
+
+
+class UpdateFactory:
+    """Build updates of a private chat with a user"""
+
+    def __init__(self):
+        self.ids = itertools.count(1)
+
+    def user(self, telegram_id) -> dict:
+        return {"id": telegram_id, "is_bot": False, "first_name": f"User {telegram_id}"}
+
+    def message(self, telegram_id, text) -> dict:
+        message = {
+            "message_id": next(self.ids),
+            "date": 0,
+            "chat": {"id": telegram_id, "type": "private"},
+            "from": self.user(telegram_id),
+            "text": text,
+        }
+        if text.startswith("/"):
+            message["entities"] = [
+                {"type": "bot_command", "offset": 0, "length": len(text.split()[0])}
+            ]
+        return {"update_id": next(self.ids), "message": message}
+
+    def callback(self, telegram_id, data) -> dict:
+        return {
+            "update_id": next(self.ids),
+            "callback_query": {
+                "id": str(next(self.ids)),
+                "chat_instance": str(telegram_id),
+                "data": data,
+                "from": self.user(telegram_id),
+                "message": {
+                    "message_id": next(self.ids),
+                    "date": 0,
+                    "chat": {"id": telegram_id, "type": "private"},
+                    "text": "Choose a birthday:",
+                },
+            },
+        }
+
+
+def scenario(updates, telegram_id, birthday_ids) -> list:
+    """Return `(module.handler name, update)` pairs one user sends during the benchmark
+
+    `birthday_ids` are ids of the user's birthdays in the fake api, the first one is
+    changed and the second one is deleted.
+    """
+    steps = [
+        ("list.list_birthdays", updates.message(telegram_id, "/list")),
+        ("add.add_birthday", updates.message(telegram_id, "/add")),
+        ("add.add_name", updates.message(telegram_id, f"Benchmark {telegram_id}")),
+        ("add.add_date", updates.message(telegram_id, "01.02.2000")),
+        ("add.skip_note", updates.message(telegram_id, "/skip")),
+    ]
+    if len(birthday_ids) >= 2:
+        change_id, delete_id = birthday_ids[:2]
+        steps += [
+            ("change.change_birthday", updates.message(telegram_id, "/change")),
+            (
+                "change.change_get_birthday",
+                updates.callback(telegram_id, str(change_id)),
+            ),
+            (
+                "change.change_name",
+                updates.message(telegram_id, f"Changed {telegram_id}"),
+            ),
+            ("change.skip_date", updates.message(telegram_id, "/skip")),
+            ("change.skip_note", updates.message(telegram_id, "/skip")),
+            ("delete.delete_birthday", updates.message(telegram_id, "/delete")),
+            (
+                "delete.delete_handle_response",
+                updates.callback(telegram_id, str(delete_id)),
+            ),
+        ]
+    steps.append(("list.list_birthdays", updates.message(telegram_id, "/list")))
+    return steps
+
+
+def percentiles(latencies) -> dict:
+    """Return count and p50/p95/p99/max of latencies in milliseconds"""
+    latencies = sorted(latencies)
+    if not latencies:
+        return {"count": 0}
+
+    def rank(percent):
+        index = max(0, -(-len(latencies) * percent // 100) - 1)
+        return round(latencies[int(index)] * 1000, 3)
+
+    return {
+        "count": len(latencies),
+        "p50_ms": rank(50),
+        "p95_ms": rank(95),
+        "p99_ms": rank(99),
+        "max_ms": round(latencies[-1] * 1000, 3),
+    }
+
+
+def peak_rss_mb() -> float:
+    """Return peak resident set size of the process in megabytes"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+async def run_users(application, args, fake_api) -> dict:
+    """Send every user's scenario, users concurrently, and measure update latencies
+
+    Updates go through the application's update processor like the bot's updates,
+    so the latency includes waiting for the processor's concurrency limit.
+    """
+    updates = UpdateFactory()
+    latencies = {}
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run_user(telegram_id):
+        birthday_ids = list(fake_api.birthdays.get(telegram_id, {}))
+        async with semaphore:
+            for handler, data in scenario(updates, telegram_id, birthday_ids):
+                update = Update.de_json(data, application.bot)
+                start = perf_counter()
+                await application.update_processor.process_update(
+                    update, application.process_update(update)
+                )
+                latencies.setdefault(handler, []).append(perf_counter() - start)
+
+    start = perf_counter()
+    await asyncio.gather(
+        *(run_user(telegram_id) for telegram_id in range(1, args.users + 1))
+    )
+    seconds = perf_counter() - start
+
+    all_latencies = list(itertools.chain.from_iterable(latencies.values()))
+    return {
+        "seconds": round(seconds, 3),
+        "updates_per_second": round(len(all_latencies) / seconds, 2),
+        "latency": percentiles(all_latencies),
+        "handlers": {
+            handler: percentiles(values) for handler, values in latencies.items()
+        },
+    }
+
+
+async def run_reminder(application, telegram) -> dict:
+    """Run the reminder job of the default bucket once and measure it"""
+    sent_before = telegram.calls.get("sendMessage", 0)
+    context = SimpleNamespace(
+        bot=application.bot,
+        job=SimpleNamespace(data=DEFAULT_BUCKET, schedule_removal=lambda: None),
+    )
+
+    start = perf_counter()
+    await reminder(context)
+    seconds = perf_counter() - start
+
+    sent = telegram.calls.get("sendMessage", 0) - sent_before
+    return {
+        "seconds": round(seconds, 3),
+        "messages": sent,
+        "messages_per_second": round(sent / seconds, 2) if seconds else 0.0,
+    }
+
+
+async def benchmark(args) -> dict:
+    server = start_fake_api(
+        users=args.users,
+        birthdays=args.birthdays,
+        latency=args.api_latency,
+        seed=args.seed,
+    )
+    api_requests.API_URL = f"http://127.0.0.1:{server.server_port}"
+
+    telegram = FakeTelegram(latency=args.telegram_latency)
+    application = (
+        ApplicationBuilder()
+        .token("1:benchmark")
+        .request(telegram)
+        .get_updates_request(FakeTelegram())
+        .concurrent_updates(PerUserUpdateProcessor(CONCURRENT_UPDATES))
+        .build()
+    )
+    application.add_handler(add_conv_handler)
+    application.add_handler(change_conv_handler)
+    application.add_handler(delete_conv_handler)
+    application.add_handler(CommandHandler("list", list_birthdays))
+    instrument_handlers(application)
+    await application.initialize()
+
+    try:
+        results = {"handlers": await run_users(application, args, server.api)}
+        if not args.skip_reminder:
+            results["reminder"] = await run_reminder(application, telegram)
+    finally:
+        await application.shutdown()
+        await session_manager.close()
+        server.shutdown()
+
+    results["api_requests"] = server.api.requests
+    results["sessions"] = session_manager.stats()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--birthdays", type=int, default=20, help="per user")
+    parser.add_argument("--concurrency", type=int, default=20, help="users at once")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--telegram-latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--skip-reminder", action="store_true")
+    parser.add_argument(
+        "--logging", action="store_true", help="log like the bot, to logs/ and console"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="file to write results to, default stdout")
+    args = parser.parse_args()
+
+    if args.logging:
+        importlib.import_module("core.logger")
+
+    # Deliveries and reminder runs go to a throwaway database
+    with tempfile.TemporaryDirectory() as directory:
+        db.init(
+            os.path.join(directory, "benchmark.db"), pragmas={"journal_mode": "wal"}
+        )
+        init_db()
+        reminder_buckets.load()
+        blocked_chats.load()
+
+        results = {
+            "parameters": vars(args),
+            **asyncio.run(benchmark(args)),
+            "peak_rss_mb": peak_rss_mb(),
+        }
+        db.close()
+
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as file:
+            file.write(output + "\n")
+    else:
+        print(output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,386 @@
+"""Stand-in for [birthday-api](https://github.com/orehzzz/birthday-api) for offline testing.
+
+Serves the part of the api the bot uses on a loopback port, with generated data,
+configurable latency and injected errors:
+
+    python -m tools.fake_api --port 8080 --users 1000 --birthdays 20 --latency 0.05
+
+Point the bot at it with `url` in the `[Api]` section of `config.ini`. It can also be
+started in-process with `start_fake_api()`, which serves from a background thread.
+"""
+
+from datetime import date, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+import argparse
+import base64
+import hashlib
+import json
+import logging
+import random
+import secrets
+import threading
+import time
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+
+# Year with no 29th of February, birthdays are generated in it
+DATE_YEAR = 2023
+INCOMING_DAYS = (0, 1, 7)
+
+
+class FakeApi:
+    """State of the fake api: key pair, logged in tokens and birthdays of users
+
+    Args:
+        users (int): Number of users with generated birthdays, telegram ids from 1
+        birthdays (int): Number of birthdays generated for every user
+        latency (float): Seconds every response is delayed by
+        jitter (float): Maximum random seconds added to `latency`
+        error_rate (float): Share of requests answered with 500, from 0 to 1
+        bot_token (str): If set, logins with another encrypted token are rejected
+        seed (int): Seed of the generated data
+
+    Attributes:
+        birthdays (dict): Birthdays of users, dicts with ids as keys, by telegram ids
+        tokens (dict): `(telegram id or None for admin, csrf token)` by access tokens
+        requests (int): Number of requests handled
+    """
+
+    def __init__(
+        self,
+        users=100,
+        birthdays=10,
+        latency=0.0,
+        jitter=0.0,
+        error_rate=0.0,
+        bot_token=None,
+        seed=0,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.bot_token = bot_token
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+
+        self.private_key = rsa.generate_private_key(
+            public_exponent=65537, key_size=2048
+        )
+        self.public_pem = (
+            self.private_key.public_key()
+            .public_bytes(
+                serialization.Encoding.PEM,
+                serialization.PublicFormat.SubjectPublicKeyInfo,
+            )
+            .decode("utf-8")
+        )
+
+        self.tokens = {}
+        self.requests = 0
+        self.next_id = 1
+        self.birthdays = {}
+        for telegram_id in range(1, users + 1):
+            for number in range(birthdays):
+                self._add(telegram_id, self._generate(number))
+
+    def _generate(self, number) -> dict:
+        day = date(DATE_YEAR, 1, 1) + timedelta(days=self.random.randrange(365))
+        return {
+            "name": f"Person {number}",
+            "day": day.day,
+            "month": day.month,
+            "year": self.random.choice([None, self.random.randint(1950, 2020)]),
+            "note": self.random.choice([None, f"Note {number}"]),
+        }
+
+    def _add(self, telegram_id, data) -> dict:
+        birthday = {"id": self.next_id, **data}
+        self.next_id += 1
+        self.birthdays.setdefault(telegram_id, {})[birthday["id"]] = birthday
+        return birthday
+
+    def login(self, encrypted_bot_id, telegram_id):
+        """Check encrypted bot token, return `(access token, csrf token)` or None"""
+        if self.bot_token is not None:
+            try:
+                bot_token = self.private_key.decrypt(
+                    base64.b64decode(encrypted_bot_id),
+                    padding.OAEP(
+                        mgf=padding.MGF1(algorithm=hashes.SHA256()),
+                        algorithm=hashes.SHA256(),
+                        label=None,
+                    ),
+                ).decode("utf-8")
+            except ValueError:
+                return None
+            if bot_token != self.bot_token:
+                return None
+
+        access_token = secrets.token_hex(16)
+        csrf_token = secrets.token_hex(16)
+        with self.lock:
+            self.tokens[access_token] = (telegram_id, csrf_token)
+        return access_token, csrf_token
+
+    def incoming(self):
+        """Yield birthdays that are today, tomorrow or in a week"""
+        today = date.today()
+        dates = {
+            (
+                (today + timedelta(days=days)).month,
+                (today + timedelta(days=days)).day,
+            ): days
+            for days in INCOMING_DAYS
+        }
+        for telegram_id, birthdays in list(self.birthdays.items()):
+            for birthday in list(birthdays.values()):
+                days = dates.get((birthday["month"], birthday["day"]))
+                if days is not None:
+                    yield {
+                        **birthday,
+                        "incoming_in_days": days,
+                        "creator": {"telegram_id": telegram_id},
+                    }
+
+
+class FakeApiHandler(BaseHTTPRequestHandler):
+    """Request handler of the fake api, `server.api` has to be a `FakeApi`"""
+
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, with Nagle's algorithm the body
+    # would wait for the ACK of the headers, delaying every response by ~40 ms
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        logging.debug("Fake api: " + format, *args)
+
+    @property
+    def api(self) -> FakeApi:
+        return self.server.api
+
+    def send_json(self, status, data, headers=()):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        return json.loads(self.body or b"null")
+
+    def authorize(self, admin=False):
+        """Return telegram id of the logged in user, None after sending 401"""
+        cookies = dict(
+            cookie.strip().split("=", 1)
+            for cookie in self.headers.get("Cookie", "").split(";")
+            if "=" in cookie
+        )
+        token = self.api.tokens.get(cookies.get("access_token_cookie"))
+        if token is None or (token[0] is None) != admin:
+            self.send_json(401, {"message": "Unauthorized"})
+            return None
+        if self.command != "GET" and self.headers.get("X-CSRF-TOKEN") != token[1]:
+            self.send_json(401, {"message": "Missing or invalid CSRF token"})
+            return None
+        return token[0] if not admin else True
+
+    def handle_request(self):
+        # The body is read before any response, an unread body on the keep-alive
+        # connection would be parsed as the next request
+        self.body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+        api = self.api
+        with api.lock:
+            api.requests += 1
+
+        delay = api.latency + api.random.uniform(0, api.jitter)
+        if delay:
+            time.sleep(delay)
+        if api.error_rate and api.random.random() < api.error_rate:
+            self.send_json(500, {"message": "Injected error"})
+            return
+
+        url = urlsplit(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        parts = url.path.strip("/").split("/")
+
+        if parts == ["public-key"]:
+            self.send_json(200, {"public_key": api.public_pem})
+        elif parts == ["login"]:
+            self.login(params.get("encrypted_bot_id", ""), int(params.get("id", 0)))
+        elif parts == ["admin", "login"]:
+            self.login(params.get("encrypted_bot_id", ""), None)
+        elif parts == ["admin", "birthdays", "incoming"]:
+            if self.authorize(admin=True):
+                self.send_incoming()
+        elif parts == ["birthdays"]:
+            telegram_id = self.authorize()
+            if telegram_id is not None:
+                self.birthdays(telegram_id)
+        elif len(parts) == 2 and parts[0] == "birthdays" and parts[1].isdigit():
+            telegram_id = self.authorize()
+            if telegram_id is not None:
+                self.birthday(telegram_id, int(parts[1]))
+        else:
+            self.send_json(404, {"message": "Not found"})
+
+    do_GET = do_POST = do_PUT = do_DELETE = handle_request
+
+    def login(self, encrypted_bot_id, telegram_id):
+        tokens = self.api.login(encrypted_bot_id, telegram_id)
+        if tokens is None:
+            self.send_json(401, {"message": "Invalid bot id"})
+            return
+
+        access_token, csrf_token = tokens
+        self.send_json(
+            200,
+            {"message": "Logged in"},
+            headers=[
+                ("Set-Cookie", f"access_token_cookie={access_token}; Path=/; HttpOnly"),
+                ("Set-Cookie", f"csrf_access_token={csrf_token}; Path=/"),
+            ],
+        )
+
+    def send_validated(self, data):
+        """Send data with ETag, or 304 if the client has the same version"""
+        etag = '"' + hashlib.sha1(json.dumps(data).encode("utf-8")).hexdigest() + '"'
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_json(200, data, headers=[("ETag", etag)])
+
+    def send_incoming(self):
+        """Send incoming birthdays as a chunked JSON array, row by row"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+        def write_chunk(text):
+            data = text.encode("utf-8")
+            self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+
+        separator = "["
+        for birthday in self.api.incoming():
+            write_chunk(separator + json.dumps(birthday))
+            separator = ","
+        write_chunk("[]" if separator == "[" else "]")
+        self.wfile.write(b"0\r\n\r\n")
+
+    def birthdays(self, telegram_id):
+        api = self.api
+        if self.command == "GET":
+            birthdays = list(api.birthdays.get(telegram_id, {}).values())
+            if not birthdays:
+                self.send_json(404, {"message": "No birthdays found"})
+                return
+            self.send_validated(birthdays)
+        elif self.command == "POST":
+            data = self.read_json()
+            with api.lock:
+                names = {b["name"] for b in api.birthdays.get(telegram_id, {}).values()}
+                if data.get("name") in names:
+                    self.send_json(
+                        422, {"message": "Name is already in use", "field": "name"}
+                    )
+                    return
+                birthday = api._add(telegram_id, data)
+            self.send_json(201, birthday)
+        else:
+            self.send_json(405, {"message": "Method not allowed"})
+
+    def birthday(self, telegram_id, birthday_id):
+        api = self.api
+        birthdays = api.birthdays.get(telegram_id, {})
+        if birthday_id not in birthdays:
+            self.send_json(404, {"message": "Birthday not found"})
+            return
+
+        if self.command == "GET":
+            self.send_validated(birthdays[birthday_id])
+        elif self.command == "PUT":
+            data = self.read_json()
+            with api.lock:
+                if any(
+                    b["name"] == data.get("name") and b["id"] != birthday_id
+                    for b in birthdays.values()
+                ):
+                    self.send_json(
+                        422, {"message": "Name is already in use", "field": "name"}
+                    )
+                    return
+                birthdays[birthday_id] = {**birthdays[birthday_id], **data}
+            self.send_json(200, birthdays[birthday_id])
+        elif self.command == "DELETE":
+            with api.lock:
+                del birthdays[birthday_id]
+            self.send_json(200, {"message": "Birthday deleted"})
+        else:
+            self.send_json(405, {"message": "Method not allowed"})
+
+
+def start_fake_api(host="127.0.0.1", port=0, **kwargs) -> ThreadingHTTPServer:
+    """Start the fake api in a background thread.
+
+    Args:
+        host (str): Address to listen on
+        port (int): Port to listen on, 0 for any free port
+        **kwargs: Arguments of `FakeApi`
+
+    Returns:
+        ThreadingHTTPServer: Running server. Its url is
+          `f"http://{host}:{server.server_port}"`, `server.api` is the `FakeApi`.
+          Stop it with `server.shutdown()`
+    """
+    server = ThreadingHTTPServer((host, port), FakeApiHandler)
+    server.daemon_threads = True
+    server.api = FakeApi(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    logging.info("Fake api is listening on http://%s:%s", host, server.server_port)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--users", type=int, default=100)
+    parser.add_argument("--birthdays", type=int, default=10, help="per user")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds")
+    parser.add_argument("--jitter", type=float, default=0.0, help="seconds")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="from 0 to 1")
+    parser.add_argument("--bot-token", help="reject logins with another token")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+
+    server = ThreadingHTTPServer((args.host, args.port), FakeApiHandler)
+    server.daemon_threads = True
+    server.api = FakeApi(
+        users=args.users,
+        birthdays=args.birthdays,
+        latency=args.latency,
+        jitter=args.jitter,
+        error_rate=args.error_rate,
+        bot_token=args.bot_token,
+        seed=args.seed,
+    )
+    logging.info("Fake api is listening on http://%s:%s", args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()